@@ -0,0 +1,30 @@
+"""
+Gunicorn configuration used by migrate.sh, for the WSGI application. The
+change feed events server has its own, gunicorn.events.conf.py.
+
+The application is loaded and warmed up once in the master before workers
+are forked (see main/warmup.py), so new workers serve their first requests
+as fast as old ones. Set GUNICORN_PRELOAD=0 to load it in each worker instead.
+"""
+import os
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.getenv('GUNICORN_WORKERS', '1'))
+preload_app = os.getenv('GUNICORN_PRELOAD', '1') == '1'
+
+
+def when_ready(server):
+    if not preload_app:
+        return
+    from main.warmup import warm_up
+
+    timings = warm_up()
+    server.log.info('Warmed up in %.0f ms', sum(seconds for _, seconds in timings) * 1000)
+
+
+def post_fork(server, worker):
+    if not preload_app:
+        return
+    from main.warmup import warm_worker
+
+    warm_worker()
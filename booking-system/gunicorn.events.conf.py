@@ -0,0 +1,13 @@
+"""
+Gunicorn configuration of the change feed events server (settings/asgi.py).
+
+Passed explicitly so gunicorn doesn't pick up ./gunicorn.conf.py, whose
+preloading and warm-up hooks are meant for the sync WSGI workers: streams
+are served by an event loop and run database queries in sync_to_async
+threads, so connections opened on fork would never be used.
+"""
+import os
+
+bind = os.getenv('GUNICORN_EVENTS_BIND', '0.0.0.0:8001')
+workers = int(os.getenv('GUNICORN_EVENTS_WORKERS', '1'))
+worker_class = 'uvicorn.workers.UvicornWorker'
@@ -2,7 +2,8 @@ from django.contrib import admin
 
 # Register your models here.
 from django.contrib import admin
-from .models import User, Hotel, Room, Booking
+from django.db import transaction
+from .models import User, Hotel, Room, Booking, Job, Change, TravelPackage, PackageDeparture, PackageBooking
 
 @admin.register(User)
 class UserAdmin(admin.ModelAdmin):
@@ -11,7 +12,7 @@ class UserAdmin(admin.ModelAdmin):
 
 @admin.register(Hotel)
 class HotelAdmin(admin.ModelAdmin):
-    list_display = ('name', 'address', 'rating')
+    list_display = ('name', 'address', 'rating', 'active_room_count', 'min_price_per_night', 'max_price_per_night')
     search_fields = ('name', 'address')
 
 @admin.register(Room)
@@ -22,6 +23,59 @@ class RoomAdmin(admin.ModelAdmin):
 
 @admin.register(Booking)
 class BookingAdmin(admin.ModelAdmin):
-    list_display = ('user', 'room', 'check_in_date', 'check_out_date', 'status', 'total_price')
+    list_display = ('user', 'room', 'check_in_date', 'check_out_date', 'status', 'total_price', 'expires_at')
     list_filter = ('status', 'check_in_date', 'check_out_date')
-    search_fields = ('user__name', 'room__room_number', 'notes')
\ No newline at end of file
+    search_fields = ('user__name', 'room__room_number', 'notes')
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('task', 'queue', 'status', 'attempts', 'run_at', 'locked_by')
+    list_filter = ('status', 'queue', 'task')
+    search_fields = ('task', 'last_error')
+
+@admin.register(Change)
+class ChangeAdmin(admin.ModelAdmin):
+    list_display = ('id', 'kind', 'hotel_id', 'object_id', 'created_at')
+    list_filter = ('kind',)
+
+class PackageDepartureInline(admin.TabularInline):
+    model = PackageDeparture
+    fields = ('departure_date', 'capacity', 'remaining')
+    readonly_fields = ('remaining',)
+    extra = 0
+
+@admin.register(TravelPackage)
+class TravelPackageAdmin(admin.ModelAdmin):
+    list_display = ('title', 'category', 'destination', 'price', 'capacity', 'remaining')
+    list_filter = ('category',)
+    search_fields = ('title', 'destination')
+    readonly_fields = ('remaining',)
+    inlines = [PackageDepartureInline]
+
+@admin.register(PackageBooking)
+class PackageBookingAdmin(admin.ModelAdmin):
+    list_display = ('name', 'email', 'package', 'departure', 'seats', 'status', 'created_at')
+    list_filter = ('status',)
+    search_fields = ('name', 'email', 'package__title')
+    # Seats are only taken by TravelPackage.book and given back by PackageBooking.cancel
+    readonly_fields = ('package', 'departure', 'seats', 'status')
+    actions = ['cancel_bookings']
+
+    def has_add_permission(self, request):
+        return False
+
+    @admin.action(description='Cancel selected bookings and give their seats back')
+    def cancel_bookings(self, request, queryset):
+        cancelled = sum(booking.cancel() for booking in queryset)
+        self.message_user(request, f'{cancelled} bookings cancelled.')
+
+    def delete_model(self, request, obj):
+        with transaction.atomic():
+            obj.cancel()
+            super().delete_model(request, obj)
+
+    def delete_queryset(self, request, queryset):
+        with transaction.atomic():
+            for booking in queryset:
+                booking.cancel()
+            super().delete_queryset(request, queryset)
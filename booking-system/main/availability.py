@@ -0,0 +1,144 @@
+"""
+Flexible-date availability search.
+
+Occupancy of a room over the search window is kept as an int bitmask, bit ``d``
+set when night ``window_start + d`` is booked. Bit operations then check every
+start date of a room at once: a stay of ``n`` nights can start on day ``d``
+when bits ``d`` to ``d + n - 1`` are all free.
+"""
+from datetime import timedelta
+
+from .models import Booking
+
+WEEKDAYS = ['mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun']
+
+MAX_WINDOW_DAYS = 366
+
+
+def parse_weekdays(value):
+    """Parse ``'sat,sun'`` or ``'5,6'`` into weekday numbers (Monday is 0)"""
+    weekdays = set()
+    for item in value.split(','):
+        item = item.strip().lower()
+        if not item:
+            continue
+        if item.isdigit() and int(item) < 7:
+            weekdays.add(int(item))
+        elif item[:3] in WEEKDAYS:
+            weekdays.add(WEEKDAYS.index(item[:3]))
+        else:
+            raise ValueError(f'Invalid weekday {item!r}')
+    return weekdays
+
+
+def range_mask(start, end):
+    """Bitmask with bits ``start`` to ``end - 1`` set"""
+    return ((1 << (end - start)) - 1) << start if end > start else 0
+
+
+def weekday_mask(window_start, days, weekdays):
+    """Bitmask of the days in the window falling on one of ``weekdays``"""
+    mask = 0
+    for day in range(days):
+        if (window_start + timedelta(days=day)).weekday() in weekdays:
+            mask |= 1 << day
+    return mask
+
+
+def feasible_starts(free, nights):
+    """
+    Bitmask of the days starting ``nights`` consecutive free days in ``free``.
+
+    Runs of free days are doubled in length at each step, so this takes
+    O(log nights) operations whatever the window size.
+    """
+    run, length = free, 1
+    while length * 2 <= nights:
+        run &= run >> length
+        length *= 2
+    if length < nights:
+        run &= run >> (nights - length)
+    return run
+
+
+def add_to_counters(counters, mask):
+    """Add one to the per-day counters for each bit of ``mask``, counters are bit planes"""
+    carry = mask
+    for index, plane in enumerate(counters):
+        if not carry:
+            return
+        counters[index], carry = plane ^ carry, plane & carry
+    if carry:
+        counters.append(carry)
+
+
+def read_counter(counters, day):
+    return sum(((plane >> day) & 1) << index for index, plane in enumerate(counters))
+
+
+def search_flexible(rooms, bookings, window_start, window_end, nights, weekdays=None):
+    """
+    Find every feasible start date for a stay of ``nights`` inside the window.
+
+    ``rooms`` holds ``(room_id, hotel_id, price_per_night)`` tuples and
+    ``bookings`` ``(room_id, check_in_date, check_out_date)`` tuples of the
+    bookings blocking those rooms. Returns one entry per start date with the
+    number of rooms free for the whole stay and the cheapest of them.
+    """
+    days = (window_end - window_start).days
+    window = range_mask(0, days)
+
+    occupancy = {}
+    for room_id, check_in, check_out in bookings:
+        start = max((check_in - window_start).days, 0)
+        end = min((check_out - window_start).days, days)
+        occupancy[room_id] = occupancy.get(room_id, 0) | range_mask(start, end)
+
+    allowed = window if weekdays is None else weekday_mask(window_start, days, weekdays)
+
+    counters = []
+    cheapest = {}
+    unassigned = allowed
+    for room_id, hotel_id, price in sorted(rooms, key=lambda room: room[2]):
+        starts = feasible_starts(window & ~occupancy.get(room_id, 0), nights) & allowed
+        if not starts:
+            continue
+        add_to_counters(counters, starts)
+        # Rooms come cheapest first, so the first room free on a day is its cheapest
+        new = starts & unassigned
+        if new:
+            unassigned &= ~new
+            while new:
+                day = (new & -new).bit_length() - 1
+                cheapest[day] = (room_id, hotel_id, price)
+                new &= new - 1
+
+    results = []
+    for day in sorted(cheapest):
+        room_id, hotel_id, price = cheapest[day]
+        check_in = window_start + timedelta(days=day)
+        results.append({
+            'check_in': check_in,
+            'check_out': check_in + timedelta(days=nights),
+            'available_rooms': read_counter(counters, day),
+            'lowest_price_per_night': price,
+            'lowest_total_price': price * nights,
+            'room': room_id,
+            'hotel': hotel_id,
+        })
+    return results
+
+
+def load_flexible_search(rooms, window_start, window_end):
+    """The room and blocking booking rows ``search_flexible`` takes, for a Room queryset, in two queries"""
+    room_rows = list(rooms.order_by().values_list('id', 'hotel_id', 'price_per_night'))
+    booking_rows = list(Booking.objects.overlapping(window_start, window_end).filter(
+        room__in=rooms.order_by().values('id')
+    ).values_list('room_id', 'check_in_date', 'check_out_date'))
+    return room_rows, booking_rows
+
+
+def flexible_search(rooms, window_start, window_end, nights, weekdays=None):
+    """Run ``search_flexible`` over a Room queryset, loading it in two queries"""
+    room_rows, booking_rows = load_flexible_search(rooms, window_start, window_end)
+    return search_flexible(room_rows, booking_rows, window_start, window_end, nights, weekdays)
@@ -0,0 +1,201 @@
+"""
+Change feed of bookings, rooms and hotels.
+
+Entries are read from ``main.models.Change`` in id order, the id of the last
+entry a client has seen being its cursor. The feed is served for catching up
+as ``GET /v1/changes/?since=<cursor>`` and as a Server-Sent Events stream at
+``STREAM_PATH`` by the ASGI application in settings/asgi.py.
+"""
+import asyncio
+import json
+import logging
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+
+from .models import Change
+from .serializers import ChangeSerializer
+
+logger = logging.getLogger(__name__)
+
+STREAM_PATH = '/v1/changes/stream/'
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+
+
+def parse_cursor(value):
+    """Parse a ``since`` cursor: an entry id, ``latest`` for the current end of the feed, or empty for its start"""
+    if not value:
+        return 0
+    if value == 'latest':
+        return Change.objects.latest_cursor()
+    if not value.isdigit():
+        raise ValueError('since must be a change id or "latest"')
+    return int(value)
+
+
+def parse_hotels(value):
+    """Parse ``'1,2'`` into hotel ids"""
+    if not value:
+        return []
+    hotels = [item.strip() for item in value.split(',') if item.strip()]
+    if not all(item.isdigit() for item in hotels):
+        raise ValueError('hotel must be a comma separated list of hotel ids')
+    return [int(item) for item in hotels]
+
+
+def parse_limit(value):
+    if not value:
+        return DEFAULT_LIMIT
+    if not value.isdigit() or int(value) < 1:
+        raise ValueError('limit must be a positive number')
+    return min(int(value), MAX_LIMIT)
+
+
+def read_changes(cursor, hotels=None, limit=DEFAULT_LIMIT):
+    """Serialized entries after ``cursor``, oldest first"""
+    return ChangeSerializer(Change.objects.after(cursor, hotels)[:limit], many=True).data
+
+
+def format_event(change):
+    """A change as a Server-Sent Events message"""
+    data = json.dumps(change, separators=(',', ':'))
+    return f"id: {change['id']}\nevent: {change['kind']}\ndata: {data}\n\n".encode()
+
+
+def _db(func):
+    """Run ``func`` in the sync thread, recycling the connection like a request would"""
+    def call(*args):
+        close_old_connections()
+        return func(*args)
+    return sync_to_async(call)
+
+
+class ChangeNotifier:
+    """
+    Polls the id of the latest change once for all the streams of a process,
+    waking up the streams that are behind it.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.latest = None
+        self._condition = None
+        self._task = None
+
+    async def wait(self, position, timeout):
+        """Wait until the feed has entries after ``position``, returning False on timeout"""
+        if self._task is None:
+            self._condition = asyncio.Condition()
+            self._task = asyncio.ensure_future(self._poll())
+        async with self._condition:
+            try:
+                await asyncio.wait_for(
+                    self._condition.wait_for(lambda: self.latest is not None and self.latest > position),
+                    timeout
+                )
+            except asyncio.TimeoutError:
+                return False
+        return True
+
+    async def _poll(self):
+        latest_cursor = _db(Change.objects.latest_cursor)
+        while True:
+            try:
+                latest = await latest_cursor()
+            except Exception:
+                logger.exception('Polling the change feed failed')
+            else:
+                if latest != self.latest:
+                    async with self._condition:
+                        self.latest = latest
+                        self._condition.notify_all()
+            await asyncio.sleep(self.interval)
+
+
+notifier = ChangeNotifier(settings.CHANGE_FEED_POLL_SECONDS)
+
+
+async def _send_error(send, status, message):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json')],
+    })
+    await send({'type': 'http.response.body', 'body': json.dumps({'error': message}).encode()})
+
+
+async def _stream(send, cursor, hotels):
+    await send({
+        'type': 'http.response.start',
+        'status': 200,
+        'headers': [
+            (b'content-type', b'text/event-stream; charset=utf-8'),
+            (b'cache-control', b'no-cache'),
+            (b'x-accel-buffering', b'no'),
+        ],
+    })
+    await send({'type': 'http.response.body', 'body': b'retry: 3000\n\n', 'more_body': True})
+
+    read = _db(read_changes)
+    # Every entry up to position was read; ahead of cursor when the hotel filter skipped some
+    position = cursor
+    while True:
+        latest = notifier.latest
+        changes = await read(position, hotels, MAX_LIMIT)
+        if changes:
+            await send({
+                'type': 'http.response.body',
+                'body': b''.join(format_event(change) for change in changes),
+                'more_body': True,
+            })
+            position = changes[-1]['id']
+            continue
+        # Changes are committed in id order, so nothing matching can still appear up to latest
+        if latest is not None:
+            position = max(position, latest)
+        if not await notifier.wait(position, settings.CHANGE_FEED_HEARTBEAT_SECONDS):
+            await send({'type': 'http.response.body', 'body': b': keep-alive\n\n', 'more_body': True})
+
+
+async def _wait_for_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def change_stream(scope, receive, send):
+    """
+    ASGI application streaming the change feed as Server-Sent Events.
+
+    Takes the same ``since`` and ``hotel`` parameters as ``GET /v1/changes/``;
+    a reconnecting ``EventSource`` resumes from its ``Last-Event-ID``.
+    """
+    params = parse_qs(scope['query_string'].decode('latin-1'))
+    headers = dict(scope['headers'])
+    since = headers.get(b'last-event-id', b'').decode('latin-1') or params.get('since', [''])[-1]
+
+    try:
+        cursor = await _db(parse_cursor)(since)
+        hotels = parse_hotels(params.get('hotel', [''])[-1])
+    except ValueError as exc:
+        await _send_error(send, 400, str(exc))
+        return
+
+    if await _db(Change.objects.is_expired_cursor)(cursor):
+        await _send_error(send, 410, 'Changes after this cursor were pruned, reload and start from "latest"')
+        return
+
+    tasks = [
+        asyncio.ensure_future(_stream(send, cursor, hotels)),
+        asyncio.ensure_future(_wait_for_disconnect(receive)),
+    ]
+    try:
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            task.result()
+    finally:
+        for task in tasks:
+            task.cancel()
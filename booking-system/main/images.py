@@ -0,0 +1,110 @@
+import hashlib
+import posixpath
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+VARIANTS_DIR = 'hotels/variants'
+
+# name -> (width, height, crop); cropped variants are filled to the exact size,
+# the others are scaled down to fit inside the box
+VARIANTS = {
+    'thumb': (240, 240, True),
+    'card': (800, 600, True),
+    'full': (1920, 1920, False),
+}
+
+# extension -> (Pillow format, save options)
+FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+def variant_name(digest, variant, extension):
+    """Storage name of a variant, derived from the source image content"""
+    return posixpath.join(VARIANTS_DIR, f'{digest[:20]}-{variant}.{extension}')
+
+
+def render_variant(image, size, crop, image_format, options):
+    """Resize ``image`` to fit ``size`` and encode it, returning the bytes"""
+    if crop:
+        resized = ImageOps.fit(image, size, Image.LANCZOS)
+    else:
+        resized = image.copy()
+        resized.thumbnail(size, Image.LANCZOS)
+
+    if image_format == 'JPEG' and resized.mode != 'RGB':
+        background = Image.new('RGB', resized.size, (255, 255, 255))
+        if resized.mode in ('RGBA', 'LA'):
+            background.paste(resized, mask=resized.getchannel('A'))
+        else:
+            background.paste(resized.convert('RGB'))
+        resized = background
+
+    output = BytesIO()
+    resized.save(output, format=image_format, **options)
+    return output.getvalue()
+
+
+def build_variants(source, force=False):
+    """
+    Build every variant of the image in the ``source`` file.
+
+    Variants are named after the content hash of the source, so ones that already
+    exist in storage are skipped unless ``force`` is set. Returns the
+    ``{variant: {extension: name}}`` mapping stored on ``Hotel.image_variants``.
+    """
+    source.open('rb')
+    try:
+        content = source.read()
+    finally:
+        source.close()
+    digest = hashlib.sha256(content).hexdigest()
+
+    names = {
+        variant: {extension: variant_name(digest, variant, extension) for extension in FORMATS}
+        for variant in VARIANTS
+    }
+    if not force and all(default_storage.exists(name) for formats in names.values() for name in formats.values()):
+        return names
+
+    with Image.open(BytesIO(content)) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'transparency' in image.info or image.mode in ('LA', 'PA') else 'RGB')
+
+        for variant, (width, height, crop) in VARIANTS.items():
+            for extension, (image_format, options) in FORMATS.items():
+                name = names[variant][extension]
+                if default_storage.exists(name):
+                    if not force:
+                        continue
+                    default_storage.delete(name)
+                data = render_variant(image, (width, height), crop, image_format, options)
+                default_storage.save(name, ContentFile(data))
+
+    return names
+
+
+def build_hotel_image_variants(hotel_id, force=False):
+    """Build the variants of a hotel's image and store their names on the hotel"""
+    from .models import Hotel
+
+    hotel = Hotel.objects.only('id', 'image').filter(pk=hotel_id).first()
+    if hotel is None or not hotel.image:
+        return None
+
+    variants = build_variants(hotel.image, force=force)
+
+    # Only record the variants if the image wasn't replaced in the meantime
+    Hotel.objects.filter(pk=hotel_id, image=hotel.image.name).update(image_variants=variants)
+    return variants
+
+
+def schedule_hotel_image_variants(hotel_id):
+    """Queue building a hotel's image variants on the job queue, see main.tasks"""
+    from .models import Job
+
+    Job.objects.enqueue('hotel.image_variants', {'hotel_id': hotel_id})
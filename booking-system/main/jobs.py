@@ -0,0 +1,241 @@
+import logging
+import os
+import random
+import socket
+import threading
+import traceback
+import uuid
+from datetime import timedelta
+
+from django.db import connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job, JobStatus
+
+logger = logging.getLogger(__name__)
+
+# Retries wait RETRY_BACKOFF * 2 ** (attempt - 1) seconds, capped at MAX_RETRY_BACKOFF
+RETRY_BACKOFF = 10
+MAX_RETRY_BACKOFF = 60 * 60
+
+# Seconds a worker waits at most before trying again after the queue itself failed
+MAX_ERROR_BACKOFF = 60
+
+_tasks = {}
+
+
+def task(name):
+    """
+    Register a function as the handler for jobs of task ``name``.
+
+    A job runs again when its worker dies between running the task and
+    deleting the job, so tasks must be safe to run more than once.
+    """
+    def register(func):
+        _tasks[name] = func
+        return func
+    return register
+
+
+def get_task(name):
+    try:
+        return _tasks[name]
+    except KeyError:
+        raise LookupError(f'No task registered as {name!r}')
+
+
+@task('jobs.noop')
+def noop(**payload):
+    """Does nothing, used to benchmark the queue"""
+
+
+def retry_delay(attempts):
+    """Exponential backoff with jitter for a job that failed ``attempts`` times"""
+    delay = min(RETRY_BACKOFF * 2 ** (attempts - 1), MAX_RETRY_BACKOFF)
+    return timedelta(seconds=delay * random.uniform(0.9, 1.1))
+
+
+def claim_jobs(worker_id, queues, limit=1):
+    """
+    Lock and mark as running up to ``limit`` due jobs from ``queues``.
+
+    On PostgreSQL concurrent workers skip each other's rows with
+    ``FOR UPDATE SKIP LOCKED``; the conditional UPDATE keeps claims exclusive
+    on backends without row locks as well.
+    """
+    now = timezone.now()
+    claim = f'{worker_id}:{uuid.uuid4().hex[:8]}'[-100:]
+    with transaction.atomic():
+        job_ids = list(
+            Job.objects.select_for_update(skip_locked=True)
+            .filter(status=JobStatus.PENDING, queue__in=queues, run_at__lte=now)
+            .order_by('run_at', 'id')
+            .values_list('id', flat=True)[:limit]
+        )
+        if not job_ids:
+            return []
+        Job.objects.filter(id__in=job_ids, status=JobStatus.PENDING).update(
+            status=JobStatus.RUNNING,
+            locked_by=claim,
+            locked_at=now,
+            attempts=F('attempts') + 1,
+            updated_at=now
+        )
+    return list(Job.objects.filter(id__in=job_ids, locked_by=claim).order_by('run_at', 'id'))
+
+
+def run_job(job):
+    """Run a claimed job, deleting it on success and rescheduling or failing it on error"""
+    try:
+        get_task(job.task)(**job.payload)
+    except Exception:
+        now = timezone.now()
+        error = traceback.format_exc()
+        if job.attempts < job.max_attempts:
+            logger.warning('Job %s (%s) failed, attempt %s of %s', job.pk, job.task, job.attempts, job.max_attempts)
+            Job.objects.filter(pk=job.pk).update(
+                status=JobStatus.PENDING,
+                run_at=now + retry_delay(job.attempts),
+                locked_by='',
+                locked_at=None,
+                last_error=error,
+                updated_at=now
+            )
+        else:
+            logger.error('Job %s (%s) failed permanently', job.pk, job.task)
+            Job.objects.filter(pk=job.pk).update(
+                status=JobStatus.FAILED,
+                locked_by='',
+                locked_at=None,
+                last_error=error,
+                updated_at=now
+            )
+        return False
+
+    Job.objects.filter(pk=job.pk).delete()
+    return True
+
+
+def keep_jobs_alive(jobs):
+    """Refresh the lock of running ``jobs``, so release_stale_jobs leaves them to their worker"""
+    now = timezone.now()
+    return Job.objects.filter(
+        pk__in=[job.pk for job in jobs],
+        locked_by__in={job.locked_by for job in jobs},
+        status=JobStatus.RUNNING
+    ).update(locked_at=now, updated_at=now)
+
+
+def release_stale_jobs(stale_after):
+    """
+    Put back running jobs whose lock wasn't refreshed for ``stale_after``.
+
+    Workers refresh the locks of the jobs they run every third of
+    ``stale_after``, so only jobs of workers that died are released.
+    """
+    now = timezone.now()
+    return Job.objects.filter(status=JobStatus.RUNNING, locked_at__lt=now - stale_after).update(
+        status=JobStatus.PENDING,
+        locked_by='',
+        locked_at=None,
+        updated_at=now
+    )
+
+
+class WorkerPool:
+    """
+    A set of worker threads that claim and run jobs until stopped.
+
+    Several pools (processes or hosts) can serve the same queues at once.
+    """
+
+    def __init__(self, queues=('default',), concurrency=1, batch_size=1, poll_interval=1.0,
+                 stale_after=timedelta(minutes=10), exit_when_empty=False):
+        self.queues = list(queues)
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.stale_after = stale_after
+        self.exit_when_empty = exit_when_empty
+        self.worker_id = f'{socket.gethostname()}:{os.getpid()}'
+        self.stop_event = threading.Event()
+        self.processed = 0
+        self.failed = 0
+        self._lock = threading.Lock()
+        # Jobs being run by the workers, by id
+        self._running = {}
+
+    def stop(self, *args):
+        self.stop_event.set()
+
+    def run(self):
+        """Run the workers and block until they are stopped"""
+        release_stale_jobs(self.stale_after)
+        threads = [
+            threading.Thread(target=self._work, args=(index,), name=f'job-worker-{index}')
+            for index in range(self.concurrency)
+        ]
+        workers_done = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(workers_done,), name='job-heartbeat')
+        heartbeat.start()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        workers_done.set()
+        heartbeat.join()
+
+    def _work(self, index):
+        worker_id = f'{self.worker_id}:{index}'
+        released_at = timezone.now()
+        errors = 0
+        try:
+            while not self.stop_event.is_set():
+                try:
+                    if index == 0 and timezone.now() - released_at > self.stale_after:
+                        release_stale_jobs(self.stale_after)
+                        released_at = timezone.now()
+                    jobs = claim_jobs(worker_id, self.queues, self.batch_size)
+                    for job in jobs:
+                        with self._lock:
+                            self._running[job.pk] = job
+                        try:
+                            succeeded = run_job(job)
+                        finally:
+                            with self._lock:
+                                del self._running[job.pk]
+                        with self._lock:
+                            self.processed += 1
+                            self.failed += not succeeded
+                except Exception:
+                    # Most likely the database went away; a fresh connection is opened on the next try
+                    errors += 1
+                    delay = min(self.poll_interval * 2 ** (errors - 1), MAX_ERROR_BACKOFF)
+                    logger.exception('Worker %s failed, retrying in %.1f seconds', worker_id, delay)
+                    connections.close_all()
+                    self.stop_event.wait(delay)
+                    continue
+                errors = 0
+                if not jobs:
+                    if self.exit_when_empty:
+                        break
+                    self.stop_event.wait(self.poll_interval)
+        finally:
+            connections.close_all()
+
+    def _heartbeat(self, workers_done):
+        """Keep the locks of running jobs fresh until the workers are done"""
+        try:
+            while not workers_done.wait(self.stale_after.total_seconds() / 3):
+                with self._lock:
+                    running = list(self._running.values())
+                if not running:
+                    continue
+                try:
+                    keep_jobs_alive(running)
+                except Exception:
+                    logger.exception('Refreshing the locks of running jobs failed')
+                    connections.close_all()
+        finally:
+            connections.close_all()
@@ -0,0 +1,40 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from main import partitions
+
+
+class Command(BaseCommand):
+    help = 'Moves booking partitions older than the retention window to the archive table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--retention-months', type=int, default=24,
+                            help='Months of check-in dates, before the current one, kept in the live table')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only list the partitions that would be archived')
+
+    def handle(self, *args, **options):
+        if not partitions.is_supported(connection):
+            raise CommandError('Booking archival requires PostgreSQL.')
+
+        before = partitions.add_months(date.today().replace(day=1), -options['retention_months'])
+
+        if options['dry_run']:
+            with connection.cursor() as cursor:
+                old = [name for name, _, end in partitions.list_partitions(cursor, partitions.BOOKING_TABLE)
+                       if end <= before]
+            for name in old:
+                self.stdout.write(f'Would archive {name}')
+            self.stdout.write(f'{len(old)} partitions with check-ins before {before} would be archived.')
+            return
+
+        with transaction.atomic():
+            archived, moved_rows = partitions.archive_partitions(connection, before)
+
+        for name in archived:
+            self.stdout.write(f'Archived {name}')
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(archived)} partitions and {moved_rows} rows from the default partition archived '
+            f'(check-ins before {before}).'
+        ))
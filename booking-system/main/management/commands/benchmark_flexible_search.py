@@ -0,0 +1,168 @@
+import random
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import Client
+from main.availability import load_flexible_search, search_flexible
+from main.models import Booking, BookingStatus, Hotel, Room, User
+from main.views import RoomViewSet
+
+ROOMS_PER_HOTEL = 100
+
+
+def naive_search(rooms, bookings, window_start, window_end, nights, weekdays):
+    """One availability check per room and start date, what clients did before"""
+    booked = {}
+    for room_id, check_in, check_out in bookings:
+        booked.setdefault(room_id, []).append((check_in, check_out))
+    results = {}
+    day = window_start
+    while day + timedelta(days=nights) <= window_end:
+        if weekdays is None or day.weekday() in weekdays:
+            check_out = day + timedelta(days=nights)
+            free = [
+                room for room in rooms
+                if not any(start < check_out and end > day for start, end in booked.get(room[0], []))
+            ]
+            if free:
+                results[day] = (len(free), min(room[2] for room in free))
+        day += timedelta(days=1)
+    return results
+
+
+def _ms(timings):
+    return f"best {min(timings) * 1000:.1f} ms, mean {sum(timings) / len(timings) * 1000:.1f} ms"
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks the flexible-date search on synthetic rooms and bookings'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rooms', type=int, default=10000)
+        parser.add_argument('--days', type=int, default=90, help='Length of the search window')
+        parser.add_argument('--nights', type=int, default=3)
+        parser.add_argument('--occupancy', type=float, default=0.7, help='Share of booked nights')
+        parser.add_argument('--weekdays', default='', help='Comma separated weekday numbers, Monday is 0')
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--verify', action='store_true', help='Compare against a naive search')
+        parser.add_argument('--database', action='store_true',
+                            help='Store the rooms and bookings (rolled back afterwards) and also time '
+                                 'loading them and the whole /v1/rooms/flexible/ request')
+
+    def handle(self, *args, **options):
+        rng = random.Random(42)
+        window_start = date.today()
+        window_end = window_start + timedelta(days=options['days'])
+        weekdays = {int(day) for day in options['weekdays'].split(',') if day} or None
+
+        rooms = [
+            (room_id, room_id // ROOMS_PER_HOTEL, Decimal(rng.randrange(5000, 50000)) / 100)
+            for room_id in range(options['rooms'])
+        ]
+        bookings = []
+        for room_id, _, _ in rooms:
+            day = rng.randrange(0, 5)
+            while day < options['days']:
+                length = rng.randint(1, 7)
+                if rng.random() < options['occupancy']:
+                    check_in = window_start + timedelta(days=day)
+                    bookings.append((room_id, check_in, check_in + timedelta(days=length)))
+                day += length
+
+        if options['database']:
+            with transaction.atomic():
+                self._store(rooms, bookings)
+                rooms, bookings, results = self._benchmark_database(window_start, window_end, weekdays, options)
+                transaction.set_rollback(True)
+        else:
+            results = self._benchmark_search(rooms, bookings, window_start, window_end, weekdays, options)
+
+        if options['verify']:
+            started = time.perf_counter()
+            expected = naive_search(rooms, bookings, window_start, window_end, options['nights'], weekdays)
+            naive_time = time.perf_counter() - started
+            actual = {
+                result['check_in']: (result['available_rooms'], result['lowest_price_per_night'])
+                for result in results
+            }
+            if actual == expected:
+                self.stdout.write(self.style.SUCCESS(f'Results match the naive search ({naive_time * 1000:.0f} ms).'))
+            else:
+                self.stdout.write(self.style.ERROR('Results differ from the naive search.'))
+
+    def _benchmark_search(self, rooms, bookings, window_start, window_end, weekdays, options):
+        timings = []
+        for _ in range(options['repeat']):
+            started = time.perf_counter()
+            results = search_flexible(rooms, bookings, window_start, window_end, options['nights'], weekdays)
+            timings.append(time.perf_counter() - started)
+
+        self.stdout.write(
+            f"{options['rooms']} rooms, {len(bookings)} bookings, {options['days']} day window, "
+            f"{options['nights']} nights: {len(results)} start dates"
+        )
+        self.stdout.write(f'search {_ms(timings)}')
+        return results
+
+    def _benchmark_database(self, window_start, window_end, weekdays, options):
+        """Time loading the rows, the search and the endpoint separately, over every active room"""
+        rooms = RoomViewSet.queryset.all()
+        params = {
+            'window_start': window_start.isoformat(),
+            'window_end': window_end.isoformat(),
+            'nights': options['nights'],
+        }
+        if weekdays is not None:
+            params['weekdays'] = ','.join(map(str, sorted(weekdays)))
+        client = Client(HTTP_HOST='localhost')
+
+        loads, searches, requests = [], [], []
+        for _ in range(options['repeat']):
+            started = time.perf_counter()
+            room_rows, booking_rows = load_flexible_search(rooms, window_start, window_end)
+            loaded = time.perf_counter()
+            results = search_flexible(room_rows, booking_rows, window_start, window_end, options['nights'], weekdays)
+            searched = time.perf_counter()
+            response = client.get('/v1/rooms/flexible/', params)
+            finished = time.perf_counter()
+            if response.status_code != 200:
+                raise RuntimeError(f'/v1/rooms/flexible/ returned {response.status_code}: {response.content[:200]}')
+            loads.append(loaded - started)
+            searches.append(searched - loaded)
+            requests.append(finished - searched)
+
+        self.stdout.write(
+            f"{len(room_rows)} rooms, {len(booking_rows)} blocking bookings in the database, "
+            f"{options['days']} day window, {options['nights']} nights: {len(results)} start dates"
+        )
+        self.stdout.write(f'load    {_ms(loads)}')
+        self.stdout.write(f'search  {_ms(searches)}')
+        self.stdout.write(f'request {_ms(requests)}')
+        return room_rows, booking_rows, results
+
+    def _store(self, rooms, bookings):
+        """Insert the synthetic rooms and bookings, in as many hotels as needed"""
+        user = User.objects.create(name='Benchmark', email='flexible-search-benchmark@example.com',
+                                   phone='0', address='Benchmark')
+        hotels = Hotel.objects.bulk_create(
+            Hotel(name=f'Benchmark hotel {index}', address='Benchmark', description='Flexible search load test')
+            for index in range(rooms[-1][1] + 1 if rooms else 0)
+        )
+        stored = Room.objects.bulk_create(
+            (Room(hotel=hotels[hotel], room_number=str(room_id), price_per_night=price)
+             for room_id, hotel, price in rooms),
+            batch_size=5000
+        )
+        Booking.objects.bulk_create(
+            (Booking(user=user, room=stored[room_id], check_in_date=check_in, check_out_date=check_out,
+                     status=BookingStatus.CONFIRMED,
+                     total_price=rooms[room_id][2] * (check_out - check_in).days)
+             for room_id, check_in, check_out in bookings),
+            batch_size=5000
+        )
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE main_room, main_booking')
@@ -0,0 +1,47 @@
+import time
+
+from django.core.management.base import BaseCommand
+from main.jobs import WorkerPool
+from main.models import Job
+
+QUEUE = 'benchmark'
+
+
+class Command(BaseCommand):
+    help = 'Measures enqueue and processing throughput of the database job queue'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--jobs', type=int, default=5000, help='Number of jobs to run')
+        parser.add_argument('--concurrency', type=int, default=4, help='Number of worker threads')
+        parser.add_argument('--batch-size', type=int, default=10, help='Jobs claimed by a worker at a time')
+
+    def handle(self, *args, **options):
+        Job.objects.filter(queue=QUEUE).delete()
+
+        started = time.perf_counter()
+        Job.objects.bulk_create(
+            [Job(queue=QUEUE, task='jobs.noop', payload={'index': index}) for index in range(options['jobs'])],
+            batch_size=1000
+        )
+        enqueue_time = time.perf_counter() - started
+
+        pool = WorkerPool(
+            queues=[QUEUE],
+            concurrency=max(options['concurrency'], 1),
+            batch_size=max(options['batch_size'], 1),
+            exit_when_empty=True
+        )
+        started = time.perf_counter()
+        pool.run()
+        run_time = time.perf_counter() - started
+
+        left = Job.objects.filter(queue=QUEUE).count()
+        Job.objects.filter(queue=QUEUE).delete()
+
+        self.stdout.write(f"Enqueued {options['jobs']} jobs in {enqueue_time:.2f}s "
+                          f"({options['jobs'] / enqueue_time:.0f} jobs/sec)")
+        self.stdout.write(f"Processed {pool.processed} jobs in {run_time:.2f}s "
+                          f"({pool.processed / run_time:.0f} jobs/sec) with {pool.concurrency} workers, "
+                          f"batch size {pool.batch_size}")
+        if left:
+            self.stdout.write(self.style.WARNING(f'{left} jobs were not processed.'))
@@ -0,0 +1,122 @@
+import json
+import threading
+import time
+from collections import Counter
+from datetime import date, timedelta
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.models import Sum
+from django.db.models.functions import Coalesce
+from django.test import Client
+from main.models import BookingStatus, Job, PackageBooking, PackageDeparture, TravelPackage
+
+
+class Command(BaseCommand):
+    help = 'Fires concurrent /book/ calls at one travel package and checks nothing was oversold'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=5000, help='Number of /book/ calls')
+        parser.add_argument('--concurrency', type=int, default=32, help='Number of concurrent clients')
+        parser.add_argument('--capacity', type=int, default=1000, help='Seats on the package')
+        parser.add_argument('--departure-capacity', type=int,
+                            help='Also book a departure date with this many seats')
+        parser.add_argument('--url', help='Base URL of a running server, e.g. http://localhost:8000; '
+                                          'by default requests are served in this process')
+        parser.add_argument('--keep', action='store_true', help="Don't delete the package afterwards")
+
+    def handle(self, *args, **options):
+        package = TravelPackage.objects.create(
+            title='Benchmark package',
+            description='Flash sale load test',
+            destination='Benchmark',
+            duration_days=3,
+            price=100,
+            available_from=date.today(),
+            available_to=date.today() + timedelta(days=30),
+            capacity=options['capacity']
+        )
+        payload = {'name': 'Load Test', 'email': 'load@example.com'}
+        departure = None
+        if options['departure_capacity'] is not None:
+            departure = PackageDeparture.objects.create(
+                package=package,
+                departure_date=date.today() + timedelta(days=7),
+                capacity=options['departure_capacity']
+            )
+            payload['departure_date'] = departure.departure_date.isoformat()
+
+        path = f'/v1/travel-packages/{package.pk}/book/'
+        statuses = Counter()
+        lock = threading.Lock()
+        concurrency = max(options['concurrency'], 1)
+
+        def client_thread(count):
+            post = self._http_post(options['url'] + path) if options['url'] else self._client_post(path)
+            results = Counter()
+            try:
+                for _ in range(count):
+                    results[post(payload)] += 1
+            finally:
+                connections.close_all()
+            with lock:
+                statuses.update(results)
+
+        counts = [options['requests'] // concurrency + (index < options['requests'] % concurrency)
+                  for index in range(concurrency)]
+        threads = [threading.Thread(target=client_thread, args=(count,)) for count in counts]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(f"{options['requests']} calls in {elapsed:.2f}s "
+                          f"({options['requests'] / elapsed:.0f} calls/sec) from {concurrency} clients")
+        self.stdout.write('Responses: ' + ', '.join(f'{code}: {count}' for code, count in sorted(statuses.items())))
+
+        bookings = PackageBooking.objects.filter(package=package, status=BookingStatus.CONFIRMED)
+        ok = self._check(package, bookings) and bookings.count() == statuses[201]
+        if departure is not None:
+            ok &= self._check(departure, bookings.filter(departure=departure))
+
+        if not options['keep']:
+            Job.objects.filter(task='travel_package.booked', payload__travel_package_id=package.pk).delete()
+            package.delete()
+
+        if ok:
+            self.stdout.write(self.style.SUCCESS('No oversells.'))
+        else:
+            self.stdout.write(self.style.ERROR('Seat counters and bookings disagree.'))
+
+    def _check(self, inventory, bookings):
+        """Compare a seat counter with the seats actually booked"""
+        inventory.refresh_from_db()
+        booked = bookings.aggregate(seats=Coalesce(Sum('seats'), 0))['seats']
+        oversold = max(booked - inventory.capacity, 0)
+        self.stdout.write(f'{inventory}: capacity {inventory.capacity}, {booked} booked, '
+                          f'{inventory.remaining} remaining, {oversold} oversold')
+        return oversold == 0 and booked + inventory.remaining == inventory.capacity
+
+    @staticmethod
+    def _client_post(path):
+        client = Client(HTTP_HOST='localhost')
+
+        def post(payload):
+            return client.post(path, payload, content_type='application/json').status_code
+        return post
+
+    @staticmethod
+    def _http_post(url):
+        def post(payload):
+            request = Request(url, data=json.dumps(payload).encode(), method='POST',
+                              headers={'Content-Type': 'application/json'})
+            try:
+                with urlopen(request) as response:
+                    return response.status
+            except HTTPError as exc:
+                return exc.code
+        return post
@@ -0,0 +1,48 @@
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from main.images import build_hotel_image_variants
+from main.models import Hotel
+
+
+def _build(hotel_id, force):
+    try:
+        return build_hotel_image_variants(hotel_id, force=force)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = 'Builds resized image variants for existing hotel images in parallel'
+
+    def add_arguments(self, parser):
+        parser.add_argument('hotel_ids', nargs='*', type=int, help='Only process these hotels')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Number of images processed at the same time')
+        parser.add_argument('--force', action='store_true',
+                            help='Rebuild variants even when they already exist')
+        parser.add_argument('--missing', action='store_true',
+                            help='Only process hotels that have no variants yet')
+
+    def handle(self, *args, **options):
+        hotels = Hotel.objects.exclude(image='').exclude(image__isnull=True)
+        if options['hotel_ids']:
+            hotels = hotels.filter(pk__in=options['hotel_ids'])
+        if options['missing']:
+            hotels = hotels.filter(image_variants={})
+        hotel_ids = list(hotels.values_list('pk', flat=True))
+
+        built = failed = 0
+        with ThreadPoolExecutor(max_workers=max(options['workers'], 1)) as executor:
+            futures = {executor.submit(_build, hotel_id, options['force']): hotel_id for hotel_id in hotel_ids}
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                    built += 1
+                except Exception as exc:
+                    failed += 1
+                    self.stderr.write(self.style.ERROR(f'Hotel {futures[future]}: {exc}'))
+
+        self.stdout.write(self.style.SUCCESS(f'Image variants built for {built} hotels, {failed} failed.'))
@@ -0,0 +1,33 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from main import partitions
+from main.models import Job, JobStatus
+
+
+class Command(BaseCommand):
+    help = 'Creates the monthly booking partitions for the coming months'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months-ahead', type=int, default=12,
+                            help='Number of future months to have partitions for')
+        parser.add_argument('--schedule', action='store_true',
+                            help='Also queue the daily job that keeps creating partitions')
+
+    def handle(self, *args, **options):
+        if not partitions.is_supported(connection):
+            raise CommandError('Booking partitioning requires PostgreSQL.')
+
+        created = partitions.ensure_partitions(connection, date.today().replace(day=1), options['months_ahead'])
+        for name in created:
+            self.stdout.write(f'Created {name}')
+
+        if options['schedule'] and not Job.objects.filter(
+            task='bookings.ensure_partitions',
+            status__in=[JobStatus.PENDING, JobStatus.RUNNING]
+        ).exists():
+            Job.objects.enqueue('bookings.ensure_partitions', {'months_ahead': options['months_ahead']})
+            self.stdout.write('Scheduled the daily partition job.')
+
+        self.stdout.write(self.style.SUCCESS(f'{len(created)} booking partitions created.'))
@@ -0,0 +1,46 @@
+import re
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from main import partitions
+from main.models import Booking, Room
+
+PARTITION = re.compile(r'\bon (main_booking_(?:p\d{4}_\d{2}|default))\b')
+
+
+class Command(BaseCommand):
+    help = 'Shows which booking partitions the hot availability queries scan, using EXPLAIN'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check-in', type=date.fromisoformat, default=date.today() + timedelta(days=7))
+        parser.add_argument('--nights', type=int, default=3)
+        parser.add_argument('--verbose-plan', action='store_true', help='Print the full query plans')
+
+    def handle(self, *args, **options):
+        if not partitions.is_supported(connection):
+            raise CommandError('Booking partitioning requires PostgreSQL.')
+
+        check_in = options['check_in']
+        check_out = check_in + timedelta(days=options['nights'])
+        with connection.cursor() as cursor:
+            total = len(partitions.list_partitions(cursor, partitions.BOOKING_TABLE)) + 1
+
+        queries = {
+            'booking conflicts': Booking.objects.overlapping(check_in, check_out).filter(room_id=1),
+            'available rooms': Room.objects.available_between(check_in, check_out),
+            'rooms in use today': Room.objects.with_availability(),
+        }
+        pruned = True
+        for label, queryset in queries.items():
+            plan = queryset.explain()
+            scanned = sorted(set(PARTITION.findall(plan)))
+            pruned &= len(scanned) < total
+            self.stdout.write(f'{label}: {len(scanned)} of {total} partitions scanned ({", ".join(scanned)})')
+            if options['verbose_plan']:
+                self.stdout.write(plan)
+
+        if pruned:
+            self.stdout.write(self.style.SUCCESS('Partition pruning applies to all queries.'))
+        else:
+            self.stdout.write(self.style.WARNING('Some queries scan every booking partition.'))
@@ -0,0 +1,68 @@
+import re
+import subprocess
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from main.warmup import warm_up, warm_worker
+
+# What a gunicorn worker imports before serving: settings, apps, WSGI handler and URLconf
+STARTUP = (
+    'import django; django.setup(); '
+    'from django.conf import settings; from importlib import import_module; '
+    'from django.core.wsgi import get_wsgi_application; '
+    'get_wsgi_application(); import_module(settings.ROOT_URLCONF)'
+)
+
+IMPORT_TIME = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+
+
+class Command(BaseCommand):
+    help = 'Reports how long starting a worker takes, per imported module and per warm-up step'
+
+    # System checks would warm this process up before it is measured
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=20, help='Number of modules and packages listed')
+        parser.add_argument('--requests', action='store_true',
+                            help='Include the WARMUP_PATHS requests in the warm-up')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c', STARTUP],
+                                capture_output=True, text=True)
+        elapsed = time.perf_counter() - started
+        if result.returncode:
+            raise CommandError(f'Starting the application failed:\n{result.stderr[-2000:]}')
+
+        modules = []
+        for line in result.stderr.splitlines():
+            match = IMPORT_TIME.match(line)
+            if match:
+                modules.append((match.group(4), int(match.group(1)) / 1000, int(match.group(2)) / 1000))
+
+        packages = {}
+        for name, own, _ in modules:
+            package = name.split('.')[0]
+            packages[package] = packages.get(package, 0) + own
+
+        self.stdout.write(f'Startup took {elapsed * 1000:.0f} ms, '
+                          f'{sum(own for _, own, _ in modules):.0f} ms of it importing {len(modules)} modules')
+
+        self.stdout.write('\nImport time by package (ms):')
+        for package, own in sorted(packages.items(), key=lambda item: -item[1])[:options['top']]:
+            self.stdout.write(f'  {own:8.1f}  {package}')
+
+        self.stdout.write('\nSlowest modules (own / with imports, ms):')
+        for name, own, cumulative in sorted(modules, key=lambda module: -module[1])[:options['top']]:
+            self.stdout.write(f'  {own:8.1f} {cumulative:8.1f}  {name}')
+
+        timings = warm_up(requests=options['requests']) + warm_worker()
+        self.stdout.write('\nWarm-up steps (ms):')
+        for step, seconds in timings:
+            self.stdout.write(f'  {seconds * 1000:8.1f}  {step}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Warm-up took {sum(seconds for _, seconds in timings) * 1000:.0f} ms.'
+        ))
@@ -0,0 +1,26 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from main.models import Change, Job, JobStatus
+
+
+class Command(BaseCommand):
+    help = 'Deletes change feed entries older than the retention period'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=7,
+                            help='Days of changes kept for clients catching up')
+        parser.add_argument('--schedule', action='store_true',
+                            help='Also queue the daily job that keeps pruning changes')
+
+    def handle(self, *args, **options):
+        deleted = Change.objects.prune(options['days'])
+
+        if options['schedule'] and not Job.objects.filter(
+            task='changes.prune',
+            status__in=[JobStatus.PENDING, JobStatus.RUNNING]
+        ).exists():
+            Job.objects.enqueue('changes.prune', {'days': options['days']}, delay=timedelta(days=1))
+            self.stdout.write('Scheduled the daily change pruning job.')
+
+        self.stdout.write(self.style.SUCCESS(f'{deleted} changes older than {options["days"]} days deleted.'))
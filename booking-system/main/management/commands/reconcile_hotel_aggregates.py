@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from main.models import Hotel
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the denormalized room aggregates stored on hotels'
+
+    def add_arguments(self, parser):
+        parser.add_argument('hotel_ids', nargs='*', type=int, help='Only reconcile these hotels')
+
+    def handle(self, *args, **options):
+        hotels = Hotel.objects.all()
+        if options['hotel_ids']:
+            hotels = hotels.filter(pk__in=options['hotel_ids'])
+
+        updated = hotels.refresh_aggregates()
+
+        self.stdout.write(self.style.SUCCESS(f'{updated} hotels reconciled.'))
@@ -0,0 +1,44 @@
+import time
+
+from django.core.management.base import BaseCommand
+from main.models import Booking, Job, JobStatus
+
+
+class Command(BaseCommand):
+    help = 'Cancels pending bookings whose hold has expired, in small batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Holds released per transaction')
+        parser.add_argument('--interval', type=float, default=0,
+                            help='Keep running, sweeping every INTERVAL seconds')
+        parser.add_argument('--schedule', action='store_true',
+                            help='Queue the job that keeps sweeping every BOOKING_HOLD_SWEEP_SECONDS instead')
+
+    def handle(self, *args, **options):
+        if options['schedule']:
+            if Job.objects.filter(
+                task='bookings.release_expired_holds',
+                status__in=[JobStatus.PENDING, JobStatus.RUNNING]
+            ).exists():
+                self.stdout.write(self.style.SUCCESS('The hold sweeping job is already scheduled.'))
+            else:
+                Job.objects.enqueue('bookings.release_expired_holds', {'batch_size': options['batch_size']})
+                self.stdout.write(self.style.SUCCESS('Scheduled the hold sweeping job.'))
+            return
+
+        while True:
+            released = self.sweep(options['batch_size'])
+            if released or not options['interval']:
+                self.stdout.write(self.style.SUCCESS(f'{released} expired holds released.'))
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
+
+    def sweep(self, batch_size):
+        released = 0
+        while True:
+            count = Booking.objects.release_expired_holds(batch_size)
+            released += count
+            if count < batch_size:
+                return released
@@ -0,0 +1,40 @@
+import signal
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from main.jobs import WorkerPool
+
+
+class Command(BaseCommand):
+    help = 'Runs background job workers against the database job queue'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queue', action='append', dest='queues',
+                            help='Queue to serve, can be repeated (default: default)')
+        parser.add_argument('--concurrency', type=int, default=4,
+                            help='Number of worker threads')
+        parser.add_argument('--batch-size', type=int, default=1,
+                            help='Jobs claimed by a worker at a time')
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help='Seconds to wait when the queue is empty')
+        parser.add_argument('--stale-after', type=int, default=600,
+                            help='Seconds after which running jobs of dead workers are retried')
+        parser.add_argument('--exit-when-empty', action='store_true',
+                            help='Stop once there are no due jobs left')
+
+    def handle(self, *args, **options):
+        pool = WorkerPool(
+            queues=options['queues'] or ['default'],
+            concurrency=max(options['concurrency'], 1),
+            batch_size=max(options['batch_size'], 1),
+            poll_interval=options['poll_interval'],
+            stale_after=timedelta(seconds=options['stale_after']),
+            exit_when_empty=options['exit_when_empty']
+        )
+        signal.signal(signal.SIGTERM, pool.stop)
+        signal.signal(signal.SIGINT, pool.stop)
+
+        self.stdout.write(f"Starting {pool.concurrency} workers on {', '.join(pool.queues)}")
+        pool.run()
+
+        self.stdout.write(self.style.SUCCESS(f'{pool.processed} jobs processed, {pool.failed} failed.'))
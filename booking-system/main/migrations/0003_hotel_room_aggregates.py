@@ -0,0 +1,75 @@
+# Generated by Django 4.2.30 on 2026-10-18 23:17
+
+from django.db import migrations, models
+from django.db.models import Count, Max, Min, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_hotel_aggregates(apps, schema_editor):
+    Hotel = apps.get_model('main', 'Hotel')
+    Room = apps.get_model('main', 'Room')
+    rooms = Room.objects.filter(hotel=OuterRef('pk'), is_active=True).order_by().values('hotel')
+
+    def aggregate(expression, **filters):
+        return Subquery(rooms.filter(**filters).annotate(value=expression).values('value'))
+
+    def count(**filters):
+        return Coalesce(aggregate(Count('pk'), **filters), 0)
+
+    Hotel.objects.update(
+        active_room_count=count(),
+        small_room_count=count(room_type='SMALL'),
+        normal_room_count=count(room_type='NORMAL'),
+        large_room_count=count(room_type='LARGE'),
+        min_price_per_night=aggregate(Min('price_per_night')),
+        max_price_per_night=aggregate(Max('price_per_night')),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0002_travelpackage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='hotel',
+            name='active_room_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='hotel',
+            name='large_room_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='hotel',
+            name='max_price_per_night',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=8, null=True),
+        ),
+        migrations.AddField(
+            model_name='hotel',
+            name='min_price_per_night',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=8, null=True),
+        ),
+        migrations.AddField(
+            model_name='hotel',
+            name='normal_room_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='hotel',
+            name='small_room_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='hotel',
+            index=models.Index(fields=['active_room_count'], name='main_hotel_active__ca9b32_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='hotel',
+            index=models.Index(fields=['min_price_per_night'], name='main_hotel_min_pri_62cb2f_idx'),
+        ),
+        migrations.RunPython(backfill_hotel_aggregates, migrations.RunPython.noop),
+    ]
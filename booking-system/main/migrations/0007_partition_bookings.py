@@ -0,0 +1,133 @@
+# Generated by Django 4.2.30 on 2026-10-18 23:26
+
+from datetime import date
+
+from django.db import migrations, models
+
+from main import partitions
+
+TABLE = partitions.BOOKING_TABLE
+ARCHIVE = partitions.ARCHIVE_TABLE
+
+
+def _table_definition(cursor, table):
+    """Index and foreign key definitions of ``table``, besides its primary key"""
+    cursor.execute(
+        "SELECT indexdef FROM pg_indexes WHERE tablename = %s AND indexname <> %s",
+        [table, f'{table}_pkey']
+    )
+    indexes = [definition.replace(' ON ONLY ', ' ON ') for (definition,) in cursor.fetchall()]
+    cursor.execute(
+        "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint WHERE conrelid = to_regclass(%s) AND contype = 'f'",
+        [table]
+    )
+    return indexes, cursor.fetchall()
+
+
+def _rebuild_booking_table(cursor, partition_by):
+    """
+    Recreate the booking table, keeping its rows, indexes, foreign keys and id
+    sequence. ``partition_by`` is ``None`` for a plain table.
+    """
+    indexes, foreign_keys = _table_definition(cursor, TABLE)
+    cursor.execute("SELECT max(id) FROM main_booking")
+    (max_id,) = cursor.fetchone()
+
+    cursor.execute("ALTER TABLE main_booking RENAME TO main_booking_old")
+    cursor.execute(
+        "CREATE TABLE main_booking (LIKE main_booking_old INCLUDING DEFAULTS INCLUDING IDENTITY)"
+        + (f" PARTITION BY {partition_by}" if partition_by else "")
+    )
+    cursor.execute("SELECT attidentity FROM pg_attribute WHERE attrelid = 'main_booking'::regclass AND attname = 'id'")
+    if not cursor.fetchone()[0]:
+        # A serial rather than identity id, keep its sequence when the old table goes
+        cursor.execute("SELECT pg_get_serial_sequence('main_booking_old', 'id')")
+        cursor.execute(f"ALTER SEQUENCE {cursor.fetchone()[0]} OWNED BY main_booking.id")
+
+    return indexes, foreign_keys, max_id
+
+
+def _finish_booking_table(cursor, primary_key, indexes, foreign_keys, max_id):
+    cursor.execute("INSERT INTO main_booking SELECT * FROM main_booking_old")
+    cursor.execute("DROP TABLE main_booking_old")
+    cursor.execute(f"ALTER TABLE main_booking ADD CONSTRAINT main_booking_pkey PRIMARY KEY ({primary_key})")
+    for definition in indexes:
+        cursor.execute(definition)
+    for name, definition in foreign_keys:
+        cursor.execute(f"ALTER TABLE main_booking ADD CONSTRAINT {name} {definition}")
+    cursor.execute("SELECT pg_get_serial_sequence('main_booking', 'id')")
+    sequence = cursor.fetchone()[0]
+    if sequence.split('.')[-1] != 'main_booking_id_seq':
+        cursor.execute(f"ALTER SEQUENCE {sequence} RENAME TO main_booking_id_seq")
+    if max_id:
+        cursor.execute("SELECT setval('main_booking_id_seq', %s)", [max_id])
+
+
+def partition_bookings(apps, schema_editor):
+    connection = schema_editor.connection
+    if not partitions.is_supported(connection):
+        return
+
+    with connection.cursor() as cursor:
+        if partitions.is_partitioned(cursor, TABLE):
+            return
+        today = date.today()
+        cursor.execute("SELECT min(check_in_date), max(check_in_date) FROM main_booking")
+        first_check_in, last_check_in = cursor.fetchone()
+        first_month = min(first_check_in or today, today)
+        last_month = max(last_check_in or today, partitions.add_months(today.replace(day=1), 12))
+
+        indexes, foreign_keys, max_id = _rebuild_booking_table(cursor, 'RANGE (check_in_date)')
+        cursor.execute("CREATE TABLE main_booking_default PARTITION OF main_booking DEFAULT")
+        for month in partitions.month_range(first_month, last_month):
+            partitions.create_partition(cursor, TABLE, month)
+        _finish_booking_table(cursor, 'id, check_in_date', indexes, foreign_keys, max_id)
+
+        cursor.execute(
+            "CREATE TABLE main_booking_archive (LIKE main_booking INCLUDING DEFAULTS) PARTITION BY RANGE (check_in_date)"
+        )
+        cursor.execute("ALTER TABLE main_booking_archive ADD PRIMARY KEY (id, check_in_date)")
+        cursor.execute("CREATE TABLE main_booking_archive_default PARTITION OF main_booking_archive DEFAULT")
+
+
+def unpartition_bookings(apps, schema_editor):
+    connection = schema_editor.connection
+    if not partitions.is_supported(connection):
+        return
+
+    with connection.cursor() as cursor:
+        if not partitions.is_partitioned(cursor, TABLE):
+            return
+        indexes, foreign_keys, max_id = _rebuild_booking_table(cursor, None)
+        cursor.execute("INSERT INTO main_booking SELECT * FROM main_booking_archive")
+        cursor.execute("DROP TABLE main_booking_archive")
+        _finish_booking_table(cursor, 'id', indexes, foreign_keys, max_id)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0006_booking_holds'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedBooking',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('check_in_date', models.DateField()),
+                ('check_out_date', models.DateField()),
+                ('status', models.CharField(choices=[('PENDING', 'Pending'), ('CONFIRMED', 'Confirmed'), ('CANCELLED', 'Cancelled')], max_length=10)),
+                ('total_price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('notes', models.TextField(blank=True, null=True)),
+                ('expires_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+            ],
+            options={
+                'db_table': 'main_booking_archive',
+                'managed': False,
+            },
+        ),
+        migrations.RunPython(partition_bookings, unpartition_bookings),
+    ]
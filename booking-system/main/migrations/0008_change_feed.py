@@ -0,0 +1,29 @@
+# Generated by Django 4.2.30 on 2026-10-18 23:31
+
+import django.core.serializers.json
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0007_partition_bookings'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Change',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('kind', models.CharField(choices=[('booking.created', 'Booking created'), ('booking.updated', 'Booking updated'), ('booking.confirmed', 'Booking confirmed'), ('booking.cancelled', 'Booking cancelled'), ('booking.expired', 'Booking hold expired'), ('booking.upgraded', 'Booking upgraded'), ('booking.deleted', 'Booking deleted'), ('room.saved', 'Room saved'), ('room.deleted', 'Room deleted'), ('hotel.saved', 'Hotel saved'), ('hotel.deleted', 'Hotel deleted')], max_length=30)),
+                ('object_id', models.PositiveBigIntegerField()),
+                ('data', models.JSONField(blank=True, default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('hotel', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='main.hotel')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['hotel', 'id'], name='main_change_hotel_i_9c2473_idx'), models.Index(fields=['created_at'], name='main_change_created_68835c_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 4.2.30 on 2026-10-18 23:36
+
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0008_change_feed'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='travelpackage',
+            name='capacity',
+            field=models.PositiveIntegerField(blank=True, help_text='Leave empty for unlimited seats', null=True),
+        ),
+        migrations.AddField(
+            model_name='travelpackage',
+            name='remaining',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.CreateModel(
+            name='PackageDeparture',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('capacity', models.PositiveIntegerField(blank=True, help_text='Leave empty for unlimited seats', null=True)),
+                ('remaining', models.PositiveIntegerField(blank=True, editable=False, null=True)),
+                ('departure_date', models.DateField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('package', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='departures', to='main.travelpackage')),
+            ],
+            options={
+                'ordering': ['departure_date'],
+                'unique_together': {('package', 'departure_date')},
+            },
+        ),
+        migrations.CreateModel(
+            name='PackageBooking',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('email', models.EmailField(max_length=254)),
+                ('seats', models.PositiveIntegerField(default=1, validators=[django.core.validators.MinValueValidator(1)])),
+                ('status', models.CharField(choices=[('PENDING', 'Pending'), ('CONFIRMED', 'Confirmed'), ('CANCELLED', 'Cancelled')], default='CONFIRMED', max_length=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('departure', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.RESTRICT, related_name='bookings', to='main.packagedeparture')),
+                ('package', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bookings', to='main.travelpackage')),
+            ],
+        ),
+    ]
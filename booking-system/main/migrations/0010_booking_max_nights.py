@@ -0,0 +1,38 @@
+# Generated by Django 4.2.30 on 2026-10-18 23:48
+
+import datetime
+from django.db import migrations, models
+import django.db.models.expressions
+
+
+MAX_NIGHTS = 90
+
+
+def check_existing_bookings(apps, schema_editor):
+    """Refuse to add the constraint over bookings that already break it, listing them"""
+    Booking = apps.get_model('main', 'Booking')
+    too_long = list(
+        Booking.objects.using(schema_editor.connection.alias).filter(
+            check_out_date__gt=models.F('check_in_date') + datetime.timedelta(days=MAX_NIGHTS)
+        ).order_by('pk').values_list('pk', flat=True)[:100]
+    )
+    if too_long:
+        raise RuntimeError(
+            f"Bookings longer than {MAX_NIGHTS} nights must be split or shortened before migrating: "
+            + ', '.join(map(str, too_long))
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0009_package_bookings'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_existing_bookings, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='booking',
+            constraint=models.CheckConstraint(check=models.Q(('check_out_date__lte', django.db.models.expressions.CombinedExpression(models.F('check_in_date'), '+', models.Value(datetime.timedelta(days=MAX_NIGHTS))))), name='booking_max_nights', violation_error_message=f"Bookings can't be longer than {MAX_NIGHTS} nights"),
+        ),
+    ]
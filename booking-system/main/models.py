@@ -1,7 +1,10 @@
 from django.db import models
 
 # Create your models here.
-from django.db import models
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections, models, transaction
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from django.core.validators import MinValueValidator
 from datetime import timedelta
@@ -20,7 +23,81 @@ class User(models.Model):
         return self.name
 
 
-class TravelPackage(models.Model):
+class SeatQuerySet(models.QuerySet):
+    """QuerySet helpers for seat inventories"""
+
+    def reserve(self, seats=1):
+        """
+        Take ``seats`` from the counter of these rows in one conditional UPDATE.
+
+        Returns whether a row had enough seats left. Concurrent reservations
+        only wait on each other for the UPDATE itself, and as the condition is
+        checked again against the row they end up updating, they never oversell.
+        """
+        return self.filter(remaining__gte=seats).update(remaining=models.F('remaining') - seats) > 0
+
+    def release(self, seats=1):
+        """Give ``seats`` back to the limited counters of these rows, never above their capacity"""
+        return self.exclude(remaining=None).update(
+            remaining=models.functions.Least(models.F('remaining') + seats, models.F('capacity'))
+        )
+
+
+class SeatInventory(models.Model):
+    """
+    Abstract model for things sold in a limited number of seats.
+
+    ``remaining`` is only ever changed relative to its current value in the
+    database, so saving a stale instance doesn't undo concurrent reservations.
+    """
+    capacity = models.PositiveIntegerField(null=True, blank=True, help_text="Leave empty for unlimited seats")
+    remaining = models.PositiveIntegerField(null=True, blank=True, editable=False)
+
+    objects = SeatQuerySet.as_manager()
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_capacity = instance.__dict__.get('capacity')
+        return instance
+
+    def booked_seats(self):
+        return self.bookings.filter(status=BookingStatus.CONFIRMED).aggregate(
+            seats=models.functions.Coalesce(models.Sum('seats'), 0)
+        )['seats']
+
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            self.remaining = self.capacity
+            super().save(*args, **kwargs)
+            self._loaded_capacity = self.capacity
+            return
+
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None:
+            update_fields = [field.name for field in self._meta.concrete_fields if not field.primary_key]
+        kwargs['update_fields'] = [name for name in update_fields if name != 'remaining']
+        super().save(*args, **kwargs)
+
+        previous = self._loaded_capacity
+        if self.capacity != previous:
+            if self.capacity is None:
+                remaining = None
+            elif previous is None:
+                remaining = max(self.capacity - self.booked_seats(), 0)
+            else:
+                remaining = models.functions.Greatest(
+                    models.F('remaining') + (self.capacity - previous), models.Value(0)
+                )
+            type(self)._default_manager.filter(pk=self.pk).update(remaining=remaining)
+            self.refresh_from_db(fields=['remaining'])
+            self._loaded_capacity = self.capacity
+
+
+class TravelPackage(SeatInventory):
     CATEGORY_CHOICES = [
         ('Adventure', 'Adventure'),
         ('Relaxation', 'Relaxation'),
@@ -44,6 +121,62 @@ class TravelPackage(models.Model):
     def __str__(self):
         return self.title
 
+    def book(self, name, email, seats=1, departure=None):
+        """
+        Reserve ``seats`` on this package, and on ``departure`` when given, and
+        record the booking and queue its confirmation. Returns ``None`` when
+        either is sold out.
+        """
+        # Counters only go down while selling, so one already short of seats when loaded still is
+        if any(inventory is not None and inventory.remaining is not None and inventory.remaining < seats
+               for inventory in (self, departure)):
+            return None
+
+        with transaction.atomic():
+            if (departure is not None and departure.capacity is not None
+                    and not PackageDeparture.objects.filter(pk=departure.pk).reserve(seats)):
+                return None
+            booking = PackageBooking.objects.create(
+                package=self,
+                departure=departure,
+                name=name,
+                email=email,
+                seats=seats
+            )
+            Job.objects.enqueue('travel_package.booked', {
+                'travel_package_id': self.pk,
+                'name': name,
+                'email': email
+            })
+            # The package-wide counter is the most contended, so it is taken last and held shortest
+            if self.capacity is not None and not TravelPackage.objects.filter(pk=self.pk).reserve(seats):
+                transaction.set_rollback(True)
+                return None
+            return booking
+
+
+class HotelQuerySet(models.QuerySet):
+    """QuerySet helpers for hotels"""
+
+    def refresh_aggregates(self):
+        """Recompute the denormalized room aggregates of these hotels in one UPDATE"""
+        rooms = Room.objects.filter(hotel=models.OuterRef('pk'), is_active=True).order_by().values('hotel')
+
+        def aggregate(expression, **filters):
+            return models.Subquery(rooms.filter(**filters).annotate(value=expression).values('value'))
+
+        def count(**filters):
+            return models.functions.Coalesce(aggregate(models.Count('pk'), **filters), 0)
+
+        return self.update(
+            active_room_count=count(),
+            small_room_count=count(room_type=RoomType.SMALL),
+            normal_room_count=count(room_type=RoomType.NORMAL),
+            large_room_count=count(room_type=RoomType.LARGE),
+            min_price_per_night=aggregate(models.Min('price_per_night')),
+            max_price_per_night=aggregate(models.Max('price_per_night')),
+        )
+
 
 class Hotel(models.Model):
     """Hotel model with basic information"""
@@ -51,13 +184,35 @@ class Hotel(models.Model):
     address = models.TextField()
     description = models.TextField()
     image = models.ImageField(upload_to='hotels/', null=True, blank=True)
+    # Resized copies of image, {variant: {extension: name}}, built by main.images
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     rating = models.DecimalField(max_digits=3, decimal_places=1, default=0.0)
+    # Aggregates over the hotel's active rooms, kept current by main.signals
+    active_room_count = models.PositiveIntegerField(default=0, editable=False)
+    small_room_count = models.PositiveIntegerField(default=0, editable=False)
+    normal_room_count = models.PositiveIntegerField(default=0, editable=False)
+    large_room_count = models.PositiveIntegerField(default=0, editable=False)
+    min_price_per_night = models.DecimalField(max_digits=8, decimal_places=2, null=True, blank=True, editable=False)
+    max_price_per_night = models.DecimalField(max_digits=8, decimal_places=2, null=True, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = HotelQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['active_room_count']),
+            models.Index(fields=['min_price_per_night']),
+        ]
+
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        # The change feed entry main.signals writes on post_save commits along with the row
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
+
 
 class RoomType(models.TextChoices):
     """Room type choices"""
@@ -66,6 +221,27 @@ class RoomType(models.TextChoices):
     LARGE = 'LARGE', _('Large')
 
 
+class RoomQuerySet(models.QuerySet):
+    """QuerySet helpers for rooms"""
+
+    def with_availability(self):
+        """Annotate ``available_now`` so ``is_available`` doesn't query per room"""
+        occupied = Booking.objects.in_progress().filter(room=models.OuterRef('pk'))
+        return self.annotate(
+            available_now=models.ExpressionWrapper(
+                models.Q(is_active=True) & ~models.Exists(occupied),
+                output_field=models.BooleanField()
+            )
+        )
+
+    def available_between(self, check_in, check_out, exclude_booking=None):
+        """Active rooms with no booking blocking any night from check_in to check_out"""
+        conflicts = Booking.objects.overlapping(check_in, check_out).filter(room=models.OuterRef('pk'))
+        if exclude_booking is not None:
+            conflicts = conflicts.exclude(pk=exclude_booking.pk)
+        return self.filter(is_active=True).exclude(models.Exists(conflicts))
+
+
 class Room(models.Model):
     """Room model with type and price information"""
     hotel = models.ForeignKey(Hotel, on_delete=models.CASCADE, related_name='rooms')
@@ -82,20 +258,25 @@ class Room(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = RoomQuerySet.as_manager()
+
     class Meta:
         unique_together = ['hotel', 'room_number']
 
     def __str__(self):
         return f"{self.hotel.name} - Room {self.room_number} ({self.get_room_type_display()})"
 
+    def save(self, *args, **kwargs):
+        # The change feed entry main.signals writes on post_save commits along with the row
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
+
     @property
     def is_available(self):
         """Check if room is available based on active bookings"""
-        return self.is_active and not self.bookings.filter(
-            status=BookingStatus.CONFIRMED,
-            check_out_date__gt=models.functions.Now(),
-            check_in_date__lte=models.functions.Now()
-        ).exists()
+        if hasattr(self, 'available_now'):
+            return self.available_now
+        return self.is_active and not Booking.objects.in_progress().filter(room=self).exists()
 
 
 class BookingStatus(models.TextChoices):
@@ -105,6 +286,75 @@ class BookingStatus(models.TextChoices):
     CANCELLED = 'CANCELLED', _('Cancelled')
 
 
+# Room types a booking of each room type may be upgraded to
+UPGRADE_PATHS = {
+    RoomType.SMALL: [RoomType.NORMAL, RoomType.LARGE],
+    RoomType.NORMAL: [RoomType.LARGE],
+    RoomType.LARGE: [],
+}
+
+
+class BookingQuerySet(models.QuerySet):
+    """QuerySet helpers for bookings"""
+
+    def blocking(self):
+        """Bookings holding their room: confirmed ones and pending holds that haven't expired"""
+        return self.filter(
+            models.Q(status=BookingStatus.CONFIRMED) |
+            models.Q(status=BookingStatus.PENDING, expires_at__gt=models.functions.Now())
+        )
+
+    def overlapping(self, check_in, check_out):
+        """Bookings that block their room for any night from check_in to check_out"""
+        return self.blocking().filter(
+            check_in_date__lt=check_out,
+            check_out_date__gt=check_in,
+            # Implied by the maximum stay, lets PostgreSQL skip older partitions
+            check_in_date__gt=check_in - timedelta(days=settings.BOOKING_MAX_NIGHTS)
+        )
+
+    def in_progress(self):
+        """Bookings blocking their room today"""
+        now = models.functions.Now()
+        return self.blocking().filter(
+            check_out_date__gt=now,
+            check_in_date__lte=now,
+            check_in_date__gt=now - timedelta(days=settings.BOOKING_MAX_NIGHTS)
+        )
+
+    def release_expired_holds(self, batch_size=1000):
+        """
+        Cancel one batch of expired holds, returning how many were released.
+
+        Each batch is its own short transaction and skips rows locked by
+        concurrent sweepers or confirmations, so call it until it returns 0.
+        """
+        from .serializers import change_data
+
+        with transaction.atomic():
+            expired = list(
+                self.select_for_update(skip_locked=True, of=('self',))
+                .select_related('room')
+                .filter(status=BookingStatus.PENDING, expires_at__lte=timezone.now())
+                .order_by('expires_at')[:batch_size]
+            )
+            if not expired:
+                return 0
+            now = timezone.now()
+            released = self.filter(pk__in=[booking.pk for booking in expired], status=BookingStatus.PENDING).update(
+                status=BookingStatus.CANCELLED,
+                updated_at=now
+            )
+            for booking in expired:
+                booking.status = BookingStatus.CANCELLED
+                booking.updated_at = now
+            Change.objects.record_many(
+                Change(kind=ChangeKind.BOOKING_EXPIRED, hotel_id=booking.room.hotel_id, object_id=booking.pk, data=data)
+                for booking, data in zip(expired, change_data(expired))
+            )
+            return released
+
+
 class Booking(models.Model):
     """Booking model with check-in/out dates and status"""
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='bookings')
@@ -118,32 +368,368 @@ class Booking(models.Model):
     )
     total_price = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(0.01)])
     notes = models.TextField(blank=True, null=True)
+    # A pending booking holds its room until it is confirmed or this passes
+    expires_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = BookingQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['expires_at'],
+                name='booking_hold_expiry_idx',
+                condition=models.Q(status='PENDING')
+            ),
+        ]
+        constraints = [
+            # BookingQuerySet relies on it to bound how far back overlapping bookings can start
+            models.CheckConstraint(
+                check=models.Q(
+                    check_out_date__lte=models.F('check_in_date') + timedelta(days=settings.BOOKING_MAX_NIGHTS)
+                ),
+                name='booking_max_nights',
+                violation_error_message=f"Bookings can't be longer than {settings.BOOKING_MAX_NIGHTS} nights"
+            ),
+        ]
+
     def __str__(self):
         return f"{self.user.name} - {self.room.room_number} ({self.check_in_date} to {self.check_out_date})"
 
-    def save(self, *args, **kwargs):
+    @property
+    def nights(self):
+        return (self.check_out_date - self.check_in_date).days
+
+    def save(self, *args, log_change=True, **kwargs):
         # Calculate total price if not already set
         if not self.pk and not self.total_price:
-            nights = (self.check_out_date - self.check_in_date).days
-            self.total_price = self.room.price_per_night * nights
+            self.total_price = self.room.price_per_night * self.nights
 
-        super().save(*args, **kwargs)
+        # New pending bookings are holds
+        if self._state.adding and self.status == BookingStatus.PENDING and self.expires_at is None:
+            self.expires_at = timezone.now() + timedelta(minutes=settings.BOOKING_HOLD_MINUTES)
+
+        created = self._state.adding
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
+            if created:
+                Job.objects.enqueue('booking.created', {'booking_id': self.pk})
+            if log_change:
+                self.log_change(ChangeKind.BOOKING_CREATED if created else ChangeKind.BOOKING_UPDATED)
+
+    def log_change(self, kind, previous_room=None):
+        """Add this booking's current state to the change feed of every hotel it affects"""
+        from .serializers import change_data
+
+        data = change_data([self])[0]
+        hotel_ids = {self.room.hotel_id}
+        if previous_room is not None:
+            data['previous_room'] = previous_room.pk
+            hotel_ids.add(previous_room.hotel_id)
+        Change.objects.record_many(
+            Change(kind=kind, hotel_id=hotel_id, object_id=self.pk, data=data) for hotel_id in hotel_ids
+        )
+
+    @property
+    def is_hold_expired(self):
+        return (
+            self.status == BookingStatus.PENDING and self.expires_at is not None
+            and self.expires_at <= timezone.now()
+        )
+
+    def confirm(self):
+        """Confirm a pending booking, unless its hold expired or the room was taken"""
+        conflicts = Booking.objects.overlapping(self.check_in_date, self.check_out_date).filter(
+            room=models.OuterRef('room')
+        ).exclude(pk=self.pk)
+        with transaction.atomic():
+            confirmed = Booking.objects.filter(
+                models.Q(expires_at__isnull=True) | models.Q(expires_at__gt=timezone.now()),
+                ~models.Exists(conflicts),
+                pk=self.pk,
+                status=BookingStatus.PENDING
+            ).update(status=BookingStatus.CONFIRMED, expires_at=None, updated_at=timezone.now())
+            if not confirmed:
+                return False
+            self.refresh_from_db(fields=['status', 'expires_at', 'updated_at'])
+            Job.objects.enqueue('booking.confirmed', {'booking_id': self.pk})
+            self.log_change(ChangeKind.BOOKING_CONFIRMED)
+        return True
 
     def cancel(self):
         """Cancel booking"""
         self.status = BookingStatus.CANCELLED
-        self.save()
+        with transaction.atomic():
+            self.save(log_change=False)
+            Job.objects.enqueue('booking.cancelled', {'booking_id': self.pk})
+            self.log_change(ChangeKind.BOOKING_CANCELLED)
         return True
 
+    def upgrade_options(self, hotel=None):
+        """
+        Rooms this booking can be upgraded to, free for its exact dates, in its
+        own hotel or ``hotel``. Each room is annotated with ``new_total_price``
+        and ``price_difference`` against the current total.
+        """
+        price = models.DecimalField(max_digits=10, decimal_places=2)
+        new_total_price = models.ExpressionWrapper(models.F('price_per_night') * self.nights, output_field=price)
+        return Room.objects.available_between(
+            self.check_in_date, self.check_out_date, exclude_booking=self
+        ).filter(
+            hotel=hotel if hotel is not None else self.room.hotel_id,
+            room_type__in=UPGRADE_PATHS[self.room.room_type]
+        ).annotate(
+            new_total_price=new_total_price,
+            price_difference=models.ExpressionWrapper(
+                new_total_price - models.Value(self.total_price, output_field=price),
+                output_field=price
+            )
+        ).order_by('price_difference', 'room_number')
+
     def upgrade_room(self, new_room):
         """Upgrade to a different room"""
-        if new_room.is_available:
+        if self.upgrade_options(hotel=new_room.hotel_id).filter(pk=new_room.pk).exists():
+            previous_room = self.room
             self.room = new_room
-            nights = (self.check_out_date - self.check_in_date).days
-            self.total_price = new_room.price_per_night * nights
-            self.save()
+            self.total_price = new_room.price_per_night * self.nights
+            with transaction.atomic():
+                self.save(log_change=False)
+                Job.objects.enqueue('booking.upgraded', {'booking_id': self.pk, 'previous_room_id': previous_room.pk})
+                self.log_change(ChangeKind.BOOKING_UPGRADED, previous_room=previous_room)
             return True
         return False
+
+
+class ArchivedBooking(models.Model):
+    """
+    Read-only view of bookings moved out of the live table by archive_bookings.
+    The table only exists on PostgreSQL, see main.partitions.
+    """
+    user = models.ForeignKey(User, on_delete=models.DO_NOTHING, related_name='+', db_constraint=False)
+    room = models.ForeignKey(Room, on_delete=models.DO_NOTHING, related_name='+', db_constraint=False)
+    check_in_date = models.DateField()
+    check_out_date = models.DateField()
+    status = models.CharField(max_length=10, choices=BookingStatus.choices)
+    total_price = models.DecimalField(max_digits=10, decimal_places=2)
+    notes = models.TextField(blank=True, null=True)
+    expires_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+
+    class Meta:
+        managed = False
+        db_table = 'main_booking_archive'
+
+    def __str__(self):
+        return f"Archived booking #{self.pk} ({self.check_in_date} to {self.check_out_date})"
+
+
+class PackageDeparture(SeatInventory):
+    """Departure date of a travel package, with its own seat inventory"""
+    package = models.ForeignKey(TravelPackage, on_delete=models.CASCADE, related_name='departures')
+    departure_date = models.DateField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['departure_date']
+        unique_together = ['package', 'departure_date']
+
+    def __str__(self):
+        return f"{self.package.title} ({self.departure_date})"
+
+
+class PackageBooking(models.Model):
+    """Seats booked on a travel package"""
+    package = models.ForeignKey(TravelPackage, on_delete=models.CASCADE, related_name='bookings')
+    departure = models.ForeignKey(
+        PackageDeparture,
+        on_delete=models.RESTRICT,
+        null=True,
+        blank=True,
+        related_name='bookings'
+    )
+    name = models.CharField(max_length=100)
+    email = models.EmailField()
+    seats = models.PositiveIntegerField(default=1, validators=[MinValueValidator(1)])
+    status = models.CharField(
+        max_length=10,
+        choices=BookingStatus.choices,
+        default=BookingStatus.CONFIRMED
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} - {self.package.title} ({self.seats} seats)"
+
+    def cancel(self):
+        """Cancel a confirmed booking and give its seats back, returning whether it was cancelled"""
+        with transaction.atomic():
+            cancelled = PackageBooking.objects.filter(pk=self.pk, status=BookingStatus.CONFIRMED).update(
+                status=BookingStatus.CANCELLED, updated_at=timezone.now()
+            )
+            if not cancelled:
+                return False
+            # Same order as TravelPackage.book, so the two never wait on each other's locks
+            if self.departure_id is not None:
+                PackageDeparture.objects.filter(pk=self.departure_id).release(self.seats)
+            TravelPackage.objects.filter(pk=self.package_id).release(self.seats)
+        self.status = BookingStatus.CANCELLED
+        return True
+
+
+class JobStatus(models.TextChoices):
+    """Background job status choices"""
+    PENDING = 'PENDING', _('Pending')
+    RUNNING = 'RUNNING', _('Running')
+    FAILED = 'FAILED', _('Failed')
+
+
+class JobQuerySet(models.QuerySet):
+    """QuerySet helpers for background jobs"""
+
+    def enqueue(self, task, payload=None, queue='default', run_at=None, delay=None, max_attempts=5):
+        """
+        Queue ``task`` (a name registered in main.jobs) to run with ``payload``.
+
+        The job is written in the current transaction, so it commits or rolls
+        back with the work it follows up on, and workers only see it once
+        committed. ``run_at`` or ``delay`` (a timedelta) schedule it for later.
+        """
+        if run_at is None:
+            run_at = timezone.now() + delay if delay else timezone.now()
+        return self.create(
+            queue=queue,
+            task=task,
+            payload=payload or {},
+            run_at=run_at,
+            max_attempts=max_attempts
+        )
+
+
+class Job(models.Model):
+    """Background job stored in the database and run by the run_workers command"""
+    queue = models.CharField(max_length=50, default='default')
+    task = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(
+        max_length=10,
+        choices=JobStatus.choices,
+        default=JobStatus.PENDING
+    )
+    run_at = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = JobQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'queue', 'run_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.task} #{self.pk} ({self.get_status_display()})"
+
+
+class ChangeKind(models.TextChoices):
+    """Change feed entry kinds"""
+    BOOKING_CREATED = 'booking.created', _('Booking created')
+    BOOKING_UPDATED = 'booking.updated', _('Booking updated')
+    BOOKING_CONFIRMED = 'booking.confirmed', _('Booking confirmed')
+    BOOKING_CANCELLED = 'booking.cancelled', _('Booking cancelled')
+    BOOKING_EXPIRED = 'booking.expired', _('Booking hold expired')
+    BOOKING_UPGRADED = 'booking.upgraded', _('Booking upgraded')
+    BOOKING_DELETED = 'booking.deleted', _('Booking deleted')
+    ROOM_SAVED = 'room.saved', _('Room saved')
+    ROOM_DELETED = 'room.deleted', _('Room deleted')
+    HOTEL_SAVED = 'hotel.saved', _('Hotel saved')
+    HOTEL_DELETED = 'hotel.deleted', _('Hotel deleted')
+
+
+# Serializes change log writers on PostgreSQL, see ChangeQuerySet.record_many
+CHANGE_LOG_LOCK = 0x6368616e6765
+
+
+class ChangeQuerySet(models.QuerySet):
+    """QuerySet helpers for the change feed"""
+
+    def record_many(self, changes):
+        """
+        Append ``changes`` to the log as part of the current transaction, so
+        they commit or roll back together with the change they describe.
+
+        Writing takes a lock held until the transaction ends, which makes
+        writers commit in id order. Readers can then never see a change
+        before an older one, and a client's cursor is simply the last id it
+        has seen. Record changes as the last step of a transaction, so the
+        lock is held briefly and never taken before a row lock.
+        """
+        changes = list(changes)
+        if not changes:
+            return
+        connection = connections[self.db]
+        with transaction.atomic(using=self.db, savepoint=False):
+            if connection.vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    cursor.execute('SELECT pg_advisory_xact_lock(%s)', [CHANGE_LOG_LOCK])
+            self.bulk_create(changes)
+
+    def record(self, kind, object_id, hotel_id, data=None):
+        self.record_many([self.model(kind=kind, object_id=object_id, hotel_id=hotel_id, data=data or {})])
+
+    def after(self, cursor, hotels=None):
+        """Changes newer than ``cursor``, oldest first, optionally of some hotels only"""
+        queryset = self.filter(pk__gt=cursor).order_by('pk')
+        if hotels:
+            queryset = queryset.filter(hotel__in=hotels)
+        return queryset
+
+    def latest_cursor(self):
+        return self.order_by('-pk').values_list('pk', flat=True).first() or 0
+
+    def is_expired_cursor(self, cursor):
+        """Whether changes after ``cursor`` may already have been pruned"""
+        oldest = self.order_by('pk').values_list('pk', flat=True).first()
+        return oldest is not None and cursor < oldest - 1
+
+    def prune(self, days):
+        """Delete changes older than ``days``, returning how many were deleted"""
+        cutoff = timezone.now() - timedelta(days=days)
+        # The newest entry is always kept, it tells clients which cursors were pruned
+        deleted, _ = self.filter(created_at__lt=cutoff).exclude(pk=self.latest_cursor()).delete()
+        return deleted
+
+
+class Change(models.Model):
+    """
+    Entry of the change feed of bookings, rooms and hotels.
+
+    ``data`` holds the state of the object after the change, so clients can
+    apply entries in id order to keep a local copy up to date.
+    """
+    id = models.BigAutoField(primary_key=True)
+    kind = models.CharField(max_length=30, choices=ChangeKind.choices)
+    # Kept after the hotel is deleted, so clients hear about the deletion
+    hotel = models.ForeignKey(Hotel, on_delete=models.DO_NOTHING, related_name='+', db_constraint=False)
+    object_id = models.PositiveBigIntegerField()
+    data = models.JSONField(default=dict, blank=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = ChangeQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['hotel', 'id']),
+            models.Index(fields=['created_at']),
+        ]
+
+    def __str__(self):
+        return f"#{self.pk} {self.kind} {self.object_id}"
@@ -0,0 +1,170 @@
+"""
+Monthly range partitioning of the booking table on PostgreSQL.
+
+``main_booking`` is partitioned by ``check_in_date``, one partition per month
+named ``main_booking_pYYYY_MM``, plus a default partition catching dates no
+partition exists for yet. ``archive_bookings`` moves old partitions over to
+``main_booking_archive``, which is partitioned the same way, so hot queries
+only touch recent months.
+"""
+import re
+from datetime import date
+
+from django.db import transaction
+
+BOOKING_TABLE = 'main_booking'
+ARCHIVE_TABLE = 'main_booking_archive'
+
+_BOUND = re.compile(r"FROM \('(\d{4}-\d{2}-\d{2})'\) TO \('(\d{4}-\d{2}-\d{2})'\)")
+
+
+def is_supported(connection):
+    return connection.vendor == 'postgresql'
+
+
+def add_months(month, months):
+    years, index = divmod(month.month - 1 + months, 12)
+    return date(month.year + years, index + 1, 1)
+
+
+def month_range(first, last):
+    """First days of every month from ``first`` to ``last`` inclusive"""
+    month = first.replace(day=1)
+    while month <= last:
+        yield month
+        month = add_months(month, 1)
+
+
+def partition_name(table, month):
+    return f'{table}_p{month:%Y_%m}'
+
+
+def default_partition_name(table):
+    return f'{table}_default'
+
+
+def is_partitioned(cursor, table):
+    cursor.execute("SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)", [table])
+    return cursor.fetchone() is not None
+
+
+def list_partitions(cursor, table):
+    """``(name, from_date, to_date)`` of the range partitions of ``table``, oldest first"""
+    cursor.execute(
+        """
+        SELECT child.relname, pg_get_expr(child.relpartbound, child.oid)
+        FROM pg_inherits
+        JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+        WHERE pg_inherits.inhparent = to_regclass(%s)
+        """,
+        [table]
+    )
+    partitions = []
+    for name, bound in cursor.fetchall():
+        match = _BOUND.search(bound)
+        if match:
+            partitions.append((name, date.fromisoformat(match.group(1)), date.fromisoformat(match.group(2))))
+    return sorted(partitions, key=lambda partition: partition[1])
+
+
+def create_partition(cursor, table, month):
+    """
+    Create the partition of ``table`` for ``month`` unless it exists.
+
+    Rows the default partition already holds for that month are moved into
+    the new partition, as PostgreSQL won't attach it while they are there.
+    Run it in a transaction: the default partition stays locked against writes
+    until the new partition is attached, so no row for the month can land in
+    it between the move and the attach.
+    """
+    name = partition_name(table, month)
+    cursor.execute("SELECT to_regclass(%s)", [name])
+    if cursor.fetchone()[0] is not None:
+        return False
+
+    start, end = month, add_months(month, 1)
+    quoted_table, quoted_name = _quote(cursor, table), _quote(cursor, name)
+    quoted_default = _quote(cursor, default_partition_name(table))
+    cursor.execute(f"LOCK TABLE {quoted_default} IN EXCLUSIVE MODE")
+    # A concurrent run may have created it while we waited for the lock
+    cursor.execute("SELECT to_regclass(%s)", [name])
+    if cursor.fetchone()[0] is not None:
+        return False
+    cursor.execute(
+        f"SELECT EXISTS (SELECT 1 FROM {quoted_default} WHERE check_in_date >= %s AND check_in_date < %s)",
+        [start, end]
+    )
+    if cursor.fetchone()[0]:
+        cursor.execute(f"CREATE TABLE {quoted_name} (LIKE {quoted_table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)")
+        cursor.execute(
+            f"""
+            WITH moved AS (
+                DELETE FROM {quoted_default} WHERE check_in_date >= %s AND check_in_date < %s RETURNING *
+            )
+            INSERT INTO {quoted_name} SELECT * FROM moved
+            """,
+            [start, end]
+        )
+        cursor.execute(f"ALTER TABLE {quoted_table} ATTACH PARTITION {quoted_name} FOR VALUES FROM (%s) TO (%s)",
+                       [start, end])
+    else:
+        cursor.execute(f"CREATE TABLE {quoted_name} PARTITION OF {quoted_table} FOR VALUES FROM (%s) TO (%s)",
+                       [start, end])
+    return True
+
+
+def ensure_partitions(connection, first_month, months_ahead=12, today=None):
+    """Create the booking partitions from ``first_month`` up to ``months_ahead`` months from now"""
+    last_month = add_months((today or date.today()).replace(day=1), months_ahead)
+    created = []
+    with connection.cursor() as cursor:
+        for month in month_range(first_month, last_month):
+            # One transaction per partition, holding the default partition's lock only briefly
+            with transaction.atomic(using=connection.alias):
+                if create_partition(cursor, BOOKING_TABLE, month):
+                    created.append(partition_name(BOOKING_TABLE, month))
+    return created
+
+
+def archive_partitions(connection, before):
+    """
+    Move the booking partitions of months before ``before`` to the archive table.
+
+    Partitions are detached and re-attached, not copied. Old rows left in the
+    default partition are moved to the archive's default partition.
+    """
+    archived = []
+    with connection.cursor() as cursor:
+        quoted_table, quoted_archive = _quote(cursor, BOOKING_TABLE), _quote(cursor, ARCHIVE_TABLE)
+        for name, start, end in list_partitions(cursor, BOOKING_TABLE):
+            if end > before:
+                continue
+            quoted_name = _quote(cursor, name)
+            cursor.execute(f"ALTER TABLE {quoted_table} DETACH PARTITION {quoted_name}")
+            # Archived rows mustn't stop users or rooms from being deleted
+            cursor.execute(
+                "SELECT conname FROM pg_constraint WHERE conrelid = to_regclass(%s) AND contype = 'f'",
+                [name]
+            )
+            for (constraint,) in cursor.fetchall():
+                cursor.execute(f"ALTER TABLE {quoted_name} DROP CONSTRAINT {_quote(cursor, constraint)}")
+            cursor.execute(f"ALTER TABLE {quoted_archive} ATTACH PARTITION {quoted_name} FOR VALUES FROM (%s) TO (%s)",
+                           [start, end])
+            archived.append(name)
+
+        cursor.execute(
+            f"""
+            WITH moved AS (
+                DELETE FROM {_quote(cursor, default_partition_name(BOOKING_TABLE))}
+                WHERE check_in_date < %s RETURNING *
+            )
+            INSERT INTO {quoted_archive} SELECT * FROM moved
+            """,
+            [before]
+        )
+        moved_rows = cursor.rowcount
+    return archived, moved_rows
+
+
+def _quote(cursor, name):
+    return cursor.db.ops.quote_name(name)
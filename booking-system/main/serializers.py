@@ -1,24 +1,251 @@
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.core.files.storage import default_storage
+from django.db.models import F, Prefetch, Window
+from django.db.models.functions import RowNumber
 from rest_framework import serializers
-from .models import User, Hotel, Room, Booking, RoomType, BookingStatus
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.reverse import reverse
+from rest_framework.settings import api_settings
+from .models import User, Hotel, Room, Booking, RoomType, BookingStatus, Change
 
 from rest_framework import serializers
-from .models import TravelPackage
+from .models import TravelPackage, PackageDeparture, PackageBooking
 
 
-class UserSerializer(serializers.ModelSerializer):
+def _split_paths(value):
+    """
+    Split ``'id,room.hotel,room.id'`` (or a list of paths) into top level names
+    and the remaining dotted paths for each of them.
+    """
+    if isinstance(value, str):
+        value = value.split(',')
+    names, nested = [], {}
+    for path in value:
+        path = path.strip()
+        if not path:
+            continue
+        name, _, rest = path.partition('.')
+        names.append(name)
+        if rest:
+            nested.setdefault(name, []).append(rest)
+    return names, nested
+
+
+def _resolve_lookup(model, lookup):
+    """
+    Resolve a ``room__hotel__name`` style lookup against ``model``.
+
+    Returns the ``only()`` and ``select_related()`` paths it needs, or ``None``
+    when part of it isn't a model field and the columns it touches are unknown.
+    """
+    only, select, path = [], [], []
+    parts = lookup.split('__')
+    for index, part in enumerate(parts):
+        try:
+            field = model._meta.pk if part == 'pk' else model._meta.get_field(part)
+        except FieldDoesNotExist:
+            return None
+        if field.many_to_many or field.one_to_many:
+            # Reverse and m2m relations are loaded by their own query
+            return only, select
+        # field.name rather than part, only() doesn't accept the pk alias
+        path.append(field.name)
+        only.append('__'.join(path))
+        if not field.is_relation or index == len(parts) - 1:
+            break
+        select.append('__'.join(path))
+        model = field.related_model
+    return only, select
+
+
+def get_room_type_counts(hotel):
+    """Active room counts of a hotel keyed by room type"""
+    return {
+        RoomType.SMALL: hotel.small_room_count,
+        RoomType.NORMAL: hotel.normal_room_count,
+        RoomType.LARGE: hotel.large_room_count,
+    }
+
+
+def get_image_variant_urls(hotel, request=None):
+    """URLs of a hotel's resized images keyed by variant and extension"""
+    urls = {}
+    for variant, formats in hotel.image_variants.items():
+        urls[variant] = {}
+        for extension, name in formats.items():
+            url = default_storage.url(name)
+            urls[variant][extension] = request.build_absolute_uri(url) if request is not None else url
+    return urls
+
+
+class DynamicFieldsMixin:
+    """
+    Serializer mixin adding sparse fieldsets and on-demand expansion.
+
+    ``?fields=id,check_in_date`` limits the output to the listed fields and
+    ``?expand=room`` replaces a related id with its nested representation
+    (see ``Meta.expandable_fields``). Both accept dotted paths for nested
+    serializers, e.g. ``?fields=id,rooms.room_number`` or ``?expand=room.hotel``.
+
+    ``Meta.field_dependencies`` lists the model lookups needed by fields that
+    aren't backed by a model field, so ``optimize_queryset`` can load just
+    the columns and relations the response will use.
+    """
+
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self._context.get('request')
+        if fields is None and expand is None and request is not None:
+            if request.method not in SAFE_METHODS:
+                return
+            fields = request.query_params.get('fields')
+            expand = request.query_params.get('expand')
+        self.apply_fieldset(fields, expand)
+
+    def apply_fieldset(self, fields=None, expand=None):
+        """Expand and prune ``self.fields`` for the requested fieldset"""
+        expand_names, nested_expand = _split_paths(expand or [])
+        expandable = getattr(self.Meta, 'expandable_fields', {})
+        for name in expand_names:
+            if name in expandable and name in self.fields:
+                serializer_class, options = expandable[name]
+                if isinstance(serializer_class, str):
+                    serializer_class = globals()[serializer_class]
+                self.fields[name] = serializer_class(read_only=True, **options)
+
+        if fields:
+            field_names, nested_fields = _split_paths(fields)
+            for name in set(self.fields) - set(field_names):
+                self.fields.pop(name)
+        else:
+            nested_fields = {}
+
+        for name, field in self.fields.items():
+            child = getattr(field, 'child', field)
+            if isinstance(child, DynamicFieldsMixin):
+                child.apply_fieldset(nested_fields.get(name), nested_expand.get(name))
+
+    def get_query_plan(self, extra=()):
+        """
+        Work out what has to be loaded to render ``self.fields``.
+
+        Returns ``(only, select_related, prefetches)``; ``only`` is ``None`` when
+        a field reads something that isn't a known model field.
+        """
+        model = self.Meta.model
+        dependencies = getattr(self.Meta, 'field_dependencies', {})
+        only, select = {model._meta.pk.name}, set()
+        lookups = list(extra)
+        nested = {}
+        for name, field in self.fields.items():
+            child = getattr(field, 'child', field)
+            if isinstance(child, DynamicFieldsMixin):
+                nested[field.source] = child
+            elif name in dependencies:
+                lookups.extend(dependencies[name])
+            elif field.source == '*':
+                only = None
+            else:
+                lookups.append(field.source.replace('.', '__'))
+
+        for lookup in lookups:
+            resolved = _resolve_lookup(model, lookup)
+            if resolved is None:
+                only = None
+                continue
+            if only is not None:
+                only.update(resolved[0])
+            select.update(resolved[1])
+
+        prefetches = []
+        for source, child in nested.items():
+            relation = model._meta.get_field(source)
+            prefix = source + '__'
+            child_extra = []
+            if relation.one_to_many:
+                child_extra.append(relation.field.name)
+            elif only is not None:
+                only.add(source)
+            # Anything the parent reads through an expanded relation is loaded
+            # by the prefetch instead, so the prefetched objects aren't replaced
+            # by partially loaded ones from select_related().
+            for path in list(only or []):
+                if path.startswith(prefix):
+                    only.discard(path)
+                    child_extra.append(path[len(prefix):])
+            for path in list(select):
+                if path == source or path.startswith(prefix):
+                    select.discard(path)
+                    if path != source:
+                        child_extra.append(path[len(prefix):] + '__pk')
+            queryset = child.optimize_queryset(child.Meta.model._default_manager.all(), extra=child_extra)
+            queryset = self.limit_nested_queryset(source, queryset)
+            prefetches.append(Prefetch(source, queryset=queryset))
+
+        return only, select, prefetches
+
+    def limit_nested_queryset(self, source, queryset):
+        """Hook to filter, order or slice the prefetch for a nested relation"""
+        return queryset
+
+    def optimize_queryset(self, queryset, extra=()):
+        """Apply ``only()``, ``select_related()`` and prefetches for ``self.fields``"""
+        only, select, prefetches = self.get_query_plan(extra)
+        if select:
+            queryset = queryset.select_related(*sorted(select))
+        if prefetches:
+            queryset = queryset.prefetch_related(*prefetches)
+        if only is not None:
+            queryset = queryset.only(*sorted(only))
+        return queryset
+
+
+class UserSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ['id', 'name', 'email', 'phone', 'address', 'created_at', 'updated_at']
         read_only_fields = ['created_at', 'updated_at']
 
 
-class TravelPackageSerializer(serializers.ModelSerializer):
+class PackageDepartureSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    class Meta:
+        model = PackageDeparture
+        fields = ['id', 'departure_date', 'capacity', 'remaining']
+
+
+class TravelPackageSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    departures = PackageDepartureSerializer(many=True, read_only=True)
+
     class Meta:
         model = TravelPackage
         fields = '__all__'
 
 
-class RoomSerializer(serializers.ModelSerializer):
+class PackageBookingSerializer(serializers.ModelSerializer):
+    departure_date = serializers.DateField(source='departure.departure_date', required=False, allow_null=True)
+
+    class Meta:
+        model = PackageBooking
+        fields = ['id', 'package', 'name', 'email', 'seats', 'departure_date', 'status', 'created_at']
+        read_only_fields = ['package', 'status', 'created_at']
+
+    def validate(self, data):
+        """Resolve departure_date to one of the package's departures, required when it has any"""
+        package = self.context['package']
+        departure_date = (data.pop('departure', None) or {}).get('departure_date')
+        if departure_date is None:
+            if package.departures.exists():
+                raise serializers.ValidationError({'departure_date': "This package requires a departure date"})
+            data['departure'] = None
+        else:
+            data['departure'] = package.departures.filter(departure_date=departure_date).first()
+            if data['departure'] is None:
+                raise serializers.ValidationError({'departure_date': "This package has no departure on this date"})
+        return data
+
+
+class RoomSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     hotel_name = serializers.StringRelatedField(source='hotel.name', read_only=True)
     room_type_display = serializers.CharField(source='get_room_type_display', read_only=True)
 
@@ -30,29 +257,103 @@ class RoomSerializer(serializers.ModelSerializer):
             'created_at', 'updated_at'
         ]
         read_only_fields = ['created_at', 'updated_at', 'is_available']
+        expandable_fields = {
+            'hotel': ('HotelListSerializer', {}),
+        }
+        field_dependencies = {
+            'room_type_display': ['room_type'],
+            'is_available': ['is_active'],
+        }
+
+    def optimize_queryset(self, queryset, extra=()):
+        queryset = super().optimize_queryset(queryset, extra)
+        if 'is_available' in self.fields:
+            queryset = queryset.with_availability()
+        return queryset
+
 
+class UpgradeOptionSerializer(RoomSerializer):
+    """A room a booking can be upgraded to, priced for the booking's dates"""
+    new_total_price = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
+    price_difference = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
 
-class HotelSerializer(serializers.ModelSerializer):
+    class Meta(RoomSerializer.Meta):
+        fields = RoomSerializer.Meta.fields + ['new_total_price', 'price_difference']
+        field_dependencies = {
+            **RoomSerializer.Meta.field_dependencies,
+            'new_total_price': [],
+            'price_difference': [],
+        }
+
+
+class HotelSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    """
+    Hotel detail. ``rooms`` holds the first page of the hotel's active rooms,
+    the full list is paginated under ``rooms_url``.
+    """
     rooms = RoomSerializer(many=True, read_only=True)
+    room_count = serializers.IntegerField(source='active_room_count', read_only=True)
+    room_type_counts = serializers.SerializerMethodField()
+    rooms_url = serializers.SerializerMethodField()
+    image_variants = serializers.SerializerMethodField()
 
     class Meta:
         model = Hotel
         fields = [
-            'id', 'name', 'address', 'description', 'image', 'rating',
-            'rooms', 'created_at', 'updated_at'
+            'id', 'name', 'address', 'description', 'image', 'image_variants', 'rating',
+            'room_count', 'room_type_counts', 'min_price_per_night', 'max_price_per_night',
+            'rooms', 'rooms_url', 'created_at', 'updated_at'
         ]
         read_only_fields = ['created_at', 'updated_at']
+        field_dependencies = {
+            'room_type_counts': ['small_room_count', 'normal_room_count', 'large_room_count'],
+            'rooms_url': [],
+            'image_variants': ['image_variants'],
+        }
+
+    def get_image_variants(self, obj):
+        return get_image_variant_urls(obj, self.context.get('request'))
+
+    def get_room_type_counts(self, obj):
+        return get_room_type_counts(obj)
 
+    def get_rooms_url(self, obj):
+        return reverse('hotel-rooms', kwargs={'hotel_pk': obj.pk}, request=self.context.get('request'))
 
-class HotelListSerializer(serializers.ModelSerializer):
-    room_count = serializers.IntegerField(source='rooms.count', read_only=True)
+    def limit_nested_queryset(self, source, queryset):
+        if source == 'rooms':
+            # A window filter rather than a slice, sliced prefetches can't be
+            # narrowed to the single hotel of a detail request.
+            queryset = queryset.filter(is_active=True).annotate(
+                position=Window(RowNumber(), partition_by=F('hotel_id'), order_by=F('room_number').asc())
+            ).filter(position__lte=api_settings.PAGE_SIZE).order_by('room_number')
+        return queryset
+
+
+class HotelListSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    room_count = serializers.IntegerField(source='active_room_count', read_only=True)
+    room_type_counts = serializers.SerializerMethodField()
+    image_variants = serializers.SerializerMethodField()
 
     class Meta:
         model = Hotel
-        fields = ['id', 'name', 'address', 'rating', 'image', 'room_count']
+        fields = [
+            'id', 'name', 'address', 'rating', 'image', 'image_variants', 'room_count', 'room_type_counts',
+            'min_price_per_night', 'max_price_per_night'
+        ]
+        field_dependencies = {
+            'room_type_counts': ['small_room_count', 'normal_room_count', 'large_room_count'],
+            'image_variants': ['image_variants'],
+        }
 
+    def get_image_variants(self, obj):
+        return get_image_variant_urls(obj, self.context.get('request'))
 
-class BookingSerializer(serializers.ModelSerializer):
+    def get_room_type_counts(self, obj):
+        return get_room_type_counts(obj)
+
+
+class BookingSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     user_name = serializers.StringRelatedField(source='user.name', read_only=True)
     room_info = serializers.StringRelatedField(source='room', read_only=True)
     status_display = serializers.CharField(source='get_status_display', read_only=True)
@@ -62,31 +363,40 @@ class BookingSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'user', 'user_name', 'room', 'room_info', 'check_in_date',
             'check_out_date', 'status', 'status_display', 'total_price', 'notes',
-            'created_at', 'updated_at'
+            'expires_at', 'created_at', 'updated_at'
         ]
-        read_only_fields = ['created_at', 'updated_at', 'total_price']
+        read_only_fields = ['created_at', 'updated_at', 'total_price', 'expires_at']
+        expandable_fields = {
+            'user': ('UserSerializer', {}),
+            'room': ('RoomSerializer', {}),
+        }
+        field_dependencies = {
+            'room_info': ['room__room_number', 'room__room_type', 'room__hotel__name'],
+            'status_display': ['status'],
+        }
 
     def validate(self, data):
         """
         Validate the booking data:
         - Check-out date must be after check-in date
+        - The stay can't be longer than BOOKING_MAX_NIGHTS
         - Room must be available for the requested dates
         """
         if data['check_in_date'] >= data['check_out_date']:
             raise serializers.ValidationError("Check-out date must be after check-in date")
 
+        if (data['check_out_date'] - data['check_in_date']).days > settings.BOOKING_MAX_NIGHTS:
+            raise serializers.ValidationError(
+                f"Bookings can't be longer than {settings.BOOKING_MAX_NIGHTS} nights"
+            )
+
         # Check if room is available for the dates
         room = data['room']
         check_in = data['check_in_date']
         check_out = data['check_out_date']
 
         # Get conflicting bookings
-        conflicting_bookings = Booking.objects.filter(
-            room=room,
-            status=BookingStatus.CONFIRMED,
-            check_in_date__lt=check_out,
-            check_out_date__gt=check_in
-        )
+        conflicting_bookings = Booking.objects.overlapping(check_in, check_out).filter(room=room)
 
         # Exclude current booking if updating
         current_booking_id = self.instance.id if self.instance else None
@@ -116,3 +426,40 @@ class RoomUpgradeSerializer(serializers.Serializer):
             return value
         except Room.DoesNotExist:
             raise serializers.ValidationError("Room not found")
+
+
+class FlexibleSearchResultSerializer(serializers.Serializer):
+    check_in = serializers.DateField()
+    check_out = serializers.DateField()
+    available_rooms = serializers.IntegerField()
+    lowest_price_per_night = serializers.DecimalField(max_digits=8, decimal_places=2)
+    lowest_total_price = serializers.DecimalField(max_digits=10, decimal_places=2)
+    room = serializers.IntegerField()
+    hotel = serializers.IntegerField()
+
+
+class ChangeSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Change
+        fields = ['id', 'kind', 'hotel', 'object_id', 'data', 'created_at']
+        read_only_fields = fields
+
+
+# Serializer and fields of the representation stored in change feed entries
+CHANGE_DATA_FIELDS = {
+    Booking: (BookingSerializer, ['user', 'room', 'check_in_date', 'check_out_date', 'status', 'expires_at']),
+    Room: (RoomSerializer, ['hotel', 'room_number', 'room_type', 'price_per_night', 'capacity', 'is_active']),
+    Hotel: (HotelListSerializer, ['name', 'address', 'rating']),
+}
+
+
+def change_data(instances):
+    """
+    The ``data`` of change feed entries for bookings, rooms or hotels of one
+    model: their API representation, limited to the fields clients sync.
+    """
+    instances = list(instances)
+    if not instances:
+        return []
+    serializer_class, fields = CHANGE_DATA_FIELDS[type(instances[0])]
+    return serializer_class(instances, many=True, fields=fields).data
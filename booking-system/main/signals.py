@@ -0,0 +1,99 @@
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+from .images import schedule_hotel_image_variants
+from .models import Booking, Change, ChangeKind, Hotel, Room
+from .serializers import change_data
+
+
+@receiver(post_init, sender=Hotel)
+def remember_hotel_image(sender, instance, **kwargs):
+    """Remember the image a hotel was loaded with, to spot uploads on save"""
+    image = instance.__dict__.get('image')
+    instance._loaded_image = getattr(image, 'name', image)
+
+
+@receiver(post_save, sender=Hotel)
+def build_hotel_image_variants_on_upload(sender, instance, raw=False, **kwargs):
+    """Build resized variants in the background when a hotel gets a new image"""
+    if raw or instance.image.name == instance._loaded_image:
+        return
+    if instance.image:
+        schedule_hotel_image_variants(instance.pk)
+    elif instance.image_variants:
+        instance.image_variants = {}
+        Hotel.objects.filter(pk=instance.pk).update(image_variants={})
+    instance._loaded_image = instance.image.name
+
+
+@receiver(post_save, sender=Hotel)
+def log_hotel_saved(sender, instance, raw=False, **kwargs):
+    """Add the hotel to the change feed"""
+    if raw:
+        return
+    Change.objects.record(ChangeKind.HOTEL_SAVED, instance.pk, instance.pk, change_data([instance])[0])
+
+
+@receiver(post_delete, sender=Hotel)
+def log_hotel_deleted(sender, instance, **kwargs):
+    """Tell the change feed the hotel and its rooms are gone"""
+    Change.objects.record(ChangeKind.HOTEL_DELETED, instance.pk, instance.pk)
+
+
+@receiver(post_init, sender=Room)
+def remember_room_hotel(sender, instance, **kwargs):
+    """Remember the hotel a room was loaded with, so moving it refreshes both hotels"""
+    # Read __dict__ directly, hotel_id may be deferred and shouldn't be fetched here
+    instance._loaded_hotel_id = instance.__dict__.get('hotel_id')
+
+
+@receiver(post_save, sender=Room)
+def refresh_hotel_aggregates_on_save(sender, instance, raw=False, **kwargs):
+    """Keep the hotel room aggregates current when a room is saved"""
+    if raw:
+        return
+    hotel_ids = {instance.hotel_id, instance._loaded_hotel_id} - {None}
+    Hotel.objects.filter(pk__in=hotel_ids).refresh_aggregates()
+
+
+@receiver(post_save, sender=Room)
+def log_room_saved(sender, instance, raw=False, **kwargs):
+    """Add the room to the change feed, of its previous hotel as well when it moved"""
+    # Connected after refresh_hotel_aggregates_on_save, so the change log lock is taken after the hotel row locks
+    if raw:
+        return
+    data = change_data([instance])[0]
+    hotel_ids = {instance.hotel_id, instance._loaded_hotel_id} - {None}
+    Change.objects.record_many(
+        Change(kind=ChangeKind.ROOM_SAVED, hotel_id=hotel_id, object_id=instance.pk, data=data)
+        for hotel_id in hotel_ids
+    )
+    instance._loaded_hotel_id = instance.hotel_id
+
+
+@receiver(post_delete, sender=Room)
+def refresh_hotel_aggregates_on_delete(sender, instance, origin=None, **kwargs):
+    """Keep the hotel room aggregates current when a room is deleted"""
+    # Rooms removed along with their hotel leave nothing to refresh
+    if getattr(origin, 'model', type(origin)) is Hotel:
+        return
+    Hotel.objects.filter(pk=instance.hotel_id).refresh_aggregates()
+
+
+@receiver(post_delete, sender=Room)
+def log_room_deleted(sender, instance, origin=None, **kwargs):
+    """Tell the change feed the room and its bookings are gone"""
+    # Rooms removed along with their hotel are covered by that change
+    if getattr(origin, 'model', type(origin)) is Hotel:
+        return
+    Change.objects.record(ChangeKind.ROOM_DELETED, instance.pk, instance.hotel_id)
+
+
+@receiver(post_delete, sender=Booking)
+def log_booking_deleted(sender, instance, origin=None, **kwargs):
+    """Tell the change feed the booking is gone"""
+    # Bookings removed along with their room or hotel are covered by that change
+    if getattr(origin, 'model', type(origin)) in (Room, Hotel):
+        return
+    Change.objects.record(ChangeKind.BOOKING_DELETED, instance.pk, instance.room.hotel_id, {
+        'room': instance.room_id,
+    })
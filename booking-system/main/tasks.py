@@ -0,0 +1,109 @@
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.core.mail import send_mail
+from django.db import connection
+
+from . import images, partitions
+from .jobs import task
+from .models import Booking, Change, Job, JobStatus, TravelPackage
+
+
+def _booking(booking_id):
+    return Booking.objects.select_related('user', 'room__hotel').filter(pk=booking_id).first()
+
+
+def _send(subject, message, recipient):
+    send_mail(subject, message, settings.DEFAULT_FROM_EMAIL, [recipient])
+
+
+@task('booking.created')
+def notify_booking_created(booking_id):
+    booking = _booking(booking_id)
+    if booking is None:
+        return
+    _send(
+        f"Booking {booking.get_status_display().lower()}: {booking.room.hotel.name}",
+        f"Hi {booking.user.name},\n\n"
+        f"Your booking for {booking.room} from {booking.check_in_date} to {booking.check_out_date} "
+        f"is {booking.get_status_display().lower()}. Total price: {booking.total_price}.",
+        booking.user.email
+    )
+
+
+@task('booking.confirmed')
+def notify_booking_confirmed(booking_id):
+    notify_booking_created(booking_id)
+
+
+@task('booking.cancelled')
+def notify_booking_cancelled(booking_id):
+    booking = _booking(booking_id)
+    if booking is None:
+        return
+    _send(
+        f"Booking cancelled: {booking.room.hotel.name}",
+        f"Hi {booking.user.name},\n\n"
+        f"Your booking for {booking.room} from {booking.check_in_date} to {booking.check_out_date} "
+        f"has been cancelled.",
+        booking.user.email
+    )
+
+
+@task('booking.upgraded')
+def notify_booking_upgraded(booking_id, previous_room_id=None):
+    booking = _booking(booking_id)
+    if booking is None:
+        return
+    _send(
+        f"Room upgraded: {booking.room.hotel.name}",
+        f"Hi {booking.user.name},\n\n"
+        f"Your booking from {booking.check_in_date} to {booking.check_out_date} has been upgraded "
+        f"to {booking.room}. New total price: {booking.total_price}.",
+        booking.user.email
+    )
+
+
+@task('hotel.image_variants')
+def build_hotel_image_variants(hotel_id):
+    images.build_hotel_image_variants(hotel_id)
+
+
+@task('travel_package.booked')
+def notify_travel_package_booked(travel_package_id, name, email):
+    travel_package = TravelPackage.objects.filter(pk=travel_package_id).first()
+    if travel_package is None:
+        return
+    _send(
+        f"Booking confirmed: {travel_package.title}",
+        f"Hi {name},\n\nYour booking for {travel_package.title} ({travel_package.destination}) is confirmed.",
+        email
+    )
+
+
+@task('bookings.ensure_partitions')
+def ensure_booking_partitions(months_ahead=12):
+    """Create upcoming booking partitions, then run again the next day"""
+    if partitions.is_supported(connection):
+        partitions.ensure_partitions(connection, date.today().replace(day=1), months_ahead)
+    if not Job.objects.filter(task='bookings.ensure_partitions', status=JobStatus.PENDING).exists():
+        Job.objects.enqueue('bookings.ensure_partitions', {'months_ahead': months_ahead}, delay=timedelta(days=1))
+
+
+@task('bookings.release_expired_holds')
+def release_expired_holds(batch_size=1000):
+    """Cancel the expired holds, then run again after BOOKING_HOLD_SWEEP_SECONDS"""
+    # Queued first, so a failing sweep doesn't end the schedule
+    if not Job.objects.filter(task='bookings.release_expired_holds', status=JobStatus.PENDING).exists():
+        Job.objects.enqueue('bookings.release_expired_holds', {'batch_size': batch_size},
+                            delay=timedelta(seconds=settings.BOOKING_HOLD_SWEEP_SECONDS))
+    while Booking.objects.release_expired_holds(batch_size) == batch_size:
+        pass
+
+
+@task('changes.prune')
+def prune_changes(days=7):
+    """Delete changes older than ``days``, then run again the next day"""
+    Change.objects.prune(days)
+    if not Job.objects.filter(task='changes.prune', status=JobStatus.PENDING).exists():
+        Job.objects.enqueue('changes.prune', {'days': days}, delay=timedelta(days=1))
@@ -1,3 +1,723 @@
-from django.test import TestCase
+import random
+import shutil
+import tempfile
+from datetime import date, timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from PIL import Image
+
+from . import jobs, partitions, warmup
+from .availability import feasible_starts, search_flexible
+from .management.commands.benchmark_flexible_search import naive_search
+from .models import (
+    Booking, BookingStatus, Change, ChangeKind, Hotel, Job, JobStatus, PackageBooking, PackageDeparture, Room,
+    RoomType, TravelPackage, User
+)
+
+
+@jobs.task('tests.fail')
+def fail(**payload):
+    raise RuntimeError('Task failed')
+
+
+class BookingDataMixin:
+    """A user, two hotels with rooms and a few bookings"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(name='Ann', email='ann@example.com', phone='1', address='Street 1')
+        cls.hotel = Hotel.objects.create(name='Grand', address='Street 2', description='Hotel', rating=4.5)
+        cls.other_hotel = Hotel.objects.create(name='Plaza', address='Street 3', description='Hotel')
+        cls.room = Room.objects.create(hotel=cls.hotel, room_number='101', room_type=RoomType.SMALL,
+                                       price_per_night=100)
+        cls.large_room = Room.objects.create(hotel=cls.hotel, room_number='201', room_type=RoomType.LARGE,
+                                             price_per_night=200)
+        cls.other_room = Room.objects.create(hotel=cls.other_hotel, room_number='1', price_per_night=120)
+        cls.booking = cls.book(cls.room, date(2030, 3, 1), date(2030, 3, 4), status=BookingStatus.CONFIRMED)
+
+    @classmethod
+    def book(cls, room, check_in_date, check_out_date, **kwargs):
+        return Booking.objects.create(user=cls.user, room=room, check_in_date=check_in_date,
+                                      check_out_date=check_out_date, **kwargs)
+
+
+class SparseFieldsetTests(BookingDataMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.book(cls.large_room, date(2030, 3, 1), date(2030, 3, 4))
+        cls.book(cls.other_room, date(2030, 3, 1), date(2030, 3, 4))
+
+    def test_fields_limit_the_output(self):
+        response = self.client.get('/v1/bookings/', {'fields': 'id,check_in_date'})
+        self.assertEqual(response.status_code, 200)
+        for booking in response.json()['results']:
+            self.assertEqual(set(booking), {'id', 'check_in_date'})
+
+    def test_expand_replaces_the_id_with_the_object(self):
+        for url in ['/v1/bookings/', f'/v1/bookings/{self.booking.pk}/']:
+            with self.subTest(url=url):
+                response = self.client.get(url, {'expand': 'room'})
+                self.assertEqual(response.status_code, 200)
+                data = response.json()
+                booking = data['results'][-1] if 'results' in data else data
+                self.assertEqual(booking['room']['room_number'], '101')
+                self.assertEqual(booking['room_info'], str(self.room))
+
+    def test_nested_expand(self):
+        response = self.client.get(f'/v1/bookings/{self.booking.pk}/', {'expand': 'room.hotel,user'})
+        self.assertEqual(response.status_code, 200)
+        booking = response.json()
+        self.assertEqual(booking['room']['hotel']['name'], 'Grand')
+        self.assertEqual(booking['user']['email'], 'ann@example.com')
+
+    def test_nested_fields_of_expanded_objects(self):
+        response = self.client.get(f'/v1/bookings/{self.booking.pk}/', {
+            'expand': 'room.hotel',
+            'fields': 'id,room_info,room.room_number,room.hotel.name',
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {
+            'id': self.booking.pk,
+            'room_info': str(self.room),
+            'room': {'room_number': '101', 'hotel': {'name': 'Grand'}},
+        })
+
+    def test_expanded_list_takes_a_fixed_number_of_queries(self):
+        # Count, bookings, then one prefetch per expanded relation
+        with self.assertNumQueries(4):
+            response = self.client.get('/v1/bookings/', {'expand': 'room.hotel'})
+        self.assertEqual(len(response.json()['results']), 3)
+
+    def test_expand_on_rooms_and_hotels(self):
+        response = self.client.get('/v1/rooms/', {'expand': 'hotel', 'fields': 'id,hotel_name,hotel.rating'})
+        self.assertEqual(response.status_code, 200)
+        room = next(room for room in response.json()['results'] if room['id'] == self.room.pk)
+        self.assertEqual(room, {'id': self.room.pk, 'hotel_name': 'Grand', 'hotel': {'rating': '4.5'}})
+
+        response = self.client.get('/v1/hotels/', {'fields': 'id,name'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.json()['results'][0]), {'id', 'name'})
+
+
+class HotelRoomsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.hotel = Hotel.objects.create(name='Grand', address='Street 2', description='Hotel')
+        cls.other_hotel = Hotel.objects.create(name='Plaza', address='Street 3', description='Hotel')
+        Room.objects.bulk_create(
+            Room(hotel=cls.hotel, room_number=f'{number:03}', price_per_night=100) for number in range(25)
+        )
+        Room.objects.create(hotel=cls.hotel, room_number='999', price_per_night=100, is_active=False)
+        Room.objects.create(hotel=cls.other_hotel, room_number='001', price_per_night=100)
+        Hotel.objects.refresh_aggregates()
+
+    def test_detail_bounds_the_nested_rooms(self):
+        with self.assertNumQueries(2):
+            response = self.client.get(f'/v1/hotels/{self.hotel.pk}/')
+        self.assertEqual(response.status_code, 200)
+        hotel = response.json()
+        self.assertEqual(hotel['room_count'], 25)
+        self.assertEqual([room['room_number'] for room in hotel['rooms']], [f'{number:03}' for number in range(10)])
+        self.assertTrue(hotel['rooms_url'].endswith(f'/v1/hotels/{self.hotel.pk}/rooms/'))
+
+    def test_rooms_sub_resource_pages_the_hotels_active_rooms(self):
+        response = self.client.get(f'/v1/hotels/{self.hotel.pk}/rooms/', {'page': 3})
+        self.assertEqual(response.status_code, 200)
+        page = response.json()
+        self.assertEqual(page['count'], 25)
+        self.assertEqual([room['room_number'] for room in page['results']],
+                         [f'{number:03}' for number in range(20, 25)])
+
+    def test_rooms_sub_resource_takes_the_room_filters(self):
+        response = self.client.get(f'/v1/hotels/{self.hotel.pk}/rooms/', {'search': '001'})
+        self.assertEqual([(room['hotel'], room['room_number']) for room in response.json()['results']],
+                         [(self.hotel.pk, '001')])
+
+    def test_rooms_of_a_missing_hotel(self):
+        self.assertEqual(self.client.get('/v1/hotels/0/rooms/').status_code, 404)
+
+
+class HotelAggregateTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.hotel = Hotel.objects.create(name='Grand', address='Street 2', description='Hotel')
+        cls.other_hotel = Hotel.objects.create(name='Plaza', address='Street 3', description='Hotel')
+
+    def assertAggregates(self, hotel, active, small, normal, large, min_price, max_price):
+        hotel.refresh_from_db()
+        self.assertEqual(
+            (hotel.active_room_count, hotel.small_room_count, hotel.normal_room_count, hotel.large_room_count,
+             hotel.min_price_per_night, hotel.max_price_per_night),
+            (active, small, normal, large, min_price, max_price)
+        )
+
+    def test_room_changes_refresh_the_aggregates(self):
+        small = Room.objects.create(hotel=self.hotel, room_number='1', room_type=RoomType.SMALL, price_per_night=80)
+        large = Room.objects.create(hotel=self.hotel, room_number='2', room_type=RoomType.LARGE, price_per_night=300)
+        self.assertAggregates(self.hotel, 2, 1, 0, 1, Decimal('80.00'), Decimal('300.00'))
+
+        large.is_active = False
+        large.save()
+        self.assertAggregates(self.hotel, 1, 1, 0, 0, Decimal('80.00'), Decimal('80.00'))
+
+        small.hotel = self.other_hotel
+        small.save()
+        self.assertAggregates(self.hotel, 0, 0, 0, 0, None, None)
+        self.assertAggregates(self.other_hotel, 1, 1, 0, 0, Decimal('80.00'), Decimal('80.00'))
+
+        small.delete()
+        self.assertAggregates(self.other_hotel, 0, 0, 0, 0, None, None)
+
+    def test_reconcile_fixes_drifted_aggregates(self):
+        Room.objects.bulk_create([
+            Room(hotel=self.hotel, room_number='1', price_per_night=100),
+            Room(hotel=self.other_hotel, room_number='1', price_per_night=150),
+        ])
+        self.assertAggregates(self.hotel, 0, 0, 0, 0, None, None)
+
+        call_command('reconcile_hotel_aggregates', self.hotel.pk, stdout=StringIO())
+        self.assertAggregates(self.hotel, 1, 0, 1, 0, Decimal('100.00'), Decimal('100.00'))
+        self.assertAggregates(self.other_hotel, 0, 0, 0, 0, None, None)
+
+        output = StringIO()
+        call_command('reconcile_hotel_aggregates', stdout=output)
+        self.assertIn('2 hotels reconciled.', output.getvalue())
+        self.assertAggregates(self.other_hotel, 1, 0, 1, 0, Decimal('150.00'), Decimal('150.00'))
+
+    def test_hotel_list_filters_and_orders_by_the_aggregates(self):
+        Room.objects.create(hotel=self.hotel, room_number='1', price_per_night=100)
+        Room.objects.create(hotel=self.hotel, room_number='2', price_per_night=120)
+        Room.objects.create(hotel=self.other_hotel, room_number='1', price_per_night=90)
+
+        response = self.client.get('/v1/hotels/', {'active_room_count__gte': 2})
+        self.assertEqual([hotel['name'] for hotel in response.json()['results']], ['Grand'])
+        response = self.client.get('/v1/hotels/', {'ordering': 'min_price_per_night'})
+        self.assertEqual([hotel['name'] for hotel in response.json()['results']], ['Plaza', 'Grand'])
+
+
+class HotelImageVariantTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def upload(self, hotel, color):
+        content = BytesIO()
+        Image.new('RGB', (1200, 900), color).save(content, format='PNG')
+        hotel.image = SimpleUploadedFile('hotel.png', content.getvalue(), content_type='image/png')
+        with self.captureOnCommitCallbacks(execute=True):
+            hotel.save()
+
+    def run_jobs(self):
+        while True:
+            claimed = jobs.claim_jobs('tests', ['default'], limit=10)
+            if not claimed:
+                return
+            for job in claimed:
+                self.assertTrue(jobs.run_job(job))
+
+    def test_upload_queues_building_the_variants(self):
+        hotel = Hotel.objects.create(name='Grand', address='Street 2', description='Hotel')
+        self.upload(hotel, 'red')
+        self.assertEqual(Job.objects.filter(task='hotel.image_variants', payload={'hotel_id': hotel.pk}).count(), 1)
+        self.run_jobs()
+
+        hotel.refresh_from_db()
+        self.assertEqual(set(hotel.image_variants), {'thumb', 'card', 'full'})
+        with Image.open(hotel.image.storage.path(hotel.image_variants['card']['webp'])) as card:
+            self.assertEqual(card.size, (800, 600))
+        response = self.client.get(f'/v1/hotels/{hotel.pk}/', {'fields': 'image_variants'})
+        self.assertTrue(response.json()['image_variants']['thumb']['jpeg'].startswith('http://testserver/media/'))
+
+    def test_saving_without_a_new_image_queues_nothing(self):
+        hotel = Hotel.objects.create(name='Grand', address='Street 2', description='Hotel')
+        self.upload(hotel, 'red')
+        self.run_jobs()
+
+        hotel.rating = 4
+        with self.captureOnCommitCallbacks(execute=True):
+            hotel.save()
+        self.assertFalse(Job.objects.exists())
+
+
+class JobQueueTests(TestCase):
+    def test_claim_jobs_claims_due_jobs_once(self):
+        due = Job.objects.create(task='jobs.noop')
+        Job.objects.create(task='jobs.noop', run_at=timezone.now() + timedelta(hours=1))
+        Job.objects.create(task='jobs.noop', queue='other')
+
+        claimed = jobs.claim_jobs('worker', ['default'], limit=10)
+        self.assertEqual([job.pk for job in claimed], [due.pk])
+        self.assertEqual(claimed[0].status, JobStatus.RUNNING)
+        self.assertEqual(claimed[0].attempts, 1)
+        self.assertTrue(claimed[0].locked_by.startswith('worker:'))
+        self.assertEqual(jobs.claim_jobs('other-worker', ['default'], limit=10), [])
+
+    def test_successful_job_is_deleted(self):
+        Job.objects.create(task='jobs.noop')
+        job, = jobs.claim_jobs('worker', ['default'])
+
+        self.assertTrue(jobs.run_job(job))
+        self.assertFalse(Job.objects.exists())
+
+    def test_failed_job_is_retried_with_backoff(self):
+        Job.objects.create(task='tests.fail', max_attempts=2)
+        job, = jobs.claim_jobs('worker', ['default'])
+
+        started = timezone.now()
+        self.assertFalse(jobs.run_job(job))
+        job.refresh_from_db()
+        self.assertEqual(job.status, JobStatus.PENDING)
+        self.assertEqual(job.locked_by, '')
+        self.assertIn('Task failed', job.last_error)
+        self.assertGreaterEqual(job.run_at, started + timedelta(seconds=jobs.RETRY_BACKOFF * 0.9))
+        self.assertEqual(jobs.claim_jobs('worker', ['default']), [])
+
+        Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        job, = jobs.claim_jobs('worker', ['default'])
+        self.assertFalse(jobs.run_job(job))
+        job.refresh_from_db()
+        self.assertEqual(job.status, JobStatus.FAILED)
+        self.assertEqual(job.attempts, 2)
+
+    def test_retry_delay_doubles_up_to_the_maximum(self):
+        for attempts, seconds in [(1, 10), (2, 20), (4, 80), (20, jobs.MAX_RETRY_BACKOFF)]:
+            delay = jobs.retry_delay(attempts).total_seconds()
+            self.assertGreaterEqual(delay, seconds * 0.9)
+            self.assertLessEqual(delay, seconds * 1.1)
+
+    def test_stale_jobs_are_released_unless_kept_alive(self):
+        Job.objects.create(task='jobs.noop')
+        Job.objects.create(task='jobs.noop')
+        alive, stale = jobs.claim_jobs('worker', ['default'], limit=2)
+        Job.objects.update(locked_at=timezone.now() - timedelta(minutes=20))
+
+        jobs.keep_jobs_alive([alive])
+        self.assertEqual(jobs.release_stale_jobs(timedelta(minutes=10)), 1)
+        stale.refresh_from_db()
+        alive.refresh_from_db()
+        self.assertEqual(stale.status, JobStatus.PENDING)
+        self.assertEqual(alive.status, JobStatus.RUNNING)
+
+    def test_jobs_are_written_with_the_work_they_follow_up_on(self):
+        user = User.objects.create(name='Ann', email='ann@example.com', phone='1', address='Street 1')
+        hotel = Hotel.objects.create(name='Grand', address='Street 2', description='Hotel')
+        room = Room.objects.create(hotel=hotel, room_number='101', price_per_night=100)
+        booking = Booking.objects.create(user=user, room=room, check_in_date=date(2030, 3, 1),
+                                         check_out_date=date(2030, 3, 4))
+        self.assertTrue(Job.objects.filter(task='booking.created', payload={'booking_id': booking.pk}).exists())
+
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            booking.cancel()
+            raise RuntimeError('Rolled back')
+        self.assertFalse(Job.objects.filter(task='booking.cancelled').exists())
+
+    def test_worker_pool_survives_queue_errors(self):
+        Job.objects.create(task='jobs.noop')
+        claim_jobs = jobs.claim_jobs
+        failures = iter([RuntimeError('Database went away')])
+
+        def flaky_claim_jobs(*args):
+            for error in failures:
+                raise error
+            return claim_jobs(*args)
+
+        pool = jobs.WorkerPool(poll_interval=0, exit_when_empty=True)
+        # Run a worker in this thread, where the test's transaction is visible
+        with mock.patch.object(jobs, 'claim_jobs', flaky_claim_jobs), \
+                mock.patch.object(jobs.connections, 'close_all'), self.assertLogs('main.jobs', 'ERROR'):
+            pool._work(0)
+        self.assertEqual((pool.processed, pool.failed), (1, 0))
+        self.assertFalse(Job.objects.exists())
+
+
+class RoomUpgradeTests(BookingDataMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.normal_room = Room.objects.create(hotel=cls.hotel, room_number='150', room_type=RoomType.NORMAL,
+                                              price_per_night=150)
+        cls.free_large_room = Room.objects.create(hotel=cls.hotel, room_number='202', room_type=RoomType.LARGE,
+                                                  price_per_night=180)
+        Room.objects.create(hotel=cls.hotel, room_number='203', room_type=RoomType.LARGE, price_per_night=100,
+                            is_active=False)
+        cls.other_large_room = Room.objects.create(hotel=cls.other_hotel, room_number='2', room_type=RoomType.LARGE,
+                                                   price_per_night=250)
+        # large_room is taken for part of the booking's stay, free_large_room only today
+        cls.book(cls.large_room, date(2030, 3, 3), date(2030, 3, 5), status=BookingStatus.CONFIRMED)
+        today = timezone.localdate()
+        cls.book(cls.free_large_room, today - timedelta(days=1), today + timedelta(days=2),
+                 status=BookingStatus.CONFIRMED)
+
+    def test_upgrade_options_lists_rooms_free_for_the_booking_dates(self):
+        # The booking, its room, then the options
+        with self.assertNumQueries(3):
+            response = self.client.get(f'/v1/bookings/{self.booking.pk}/upgrade-options/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(room['room_number'], room['new_total_price'], room['price_difference']) for room in response.json()],
+            [('150', '450.00', '150.00'), ('202', '540.00', '240.00')]
+        )
+
+    def test_upgrade_options_in_another_hotel(self):
+        response = self.client.get(f'/v1/bookings/{self.booking.pk}/upgrade-options/',
+                                   {'hotel': self.other_hotel.pk, 'fields': 'id,price_difference'})
+        self.assertEqual(response.json(), [
+            {'id': self.other_room.pk, 'price_difference': '60.00'},
+            {'id': self.other_large_room.pk, 'price_difference': '450.00'},
+        ])
+        response = self.client.get(f'/v1/bookings/{self.booking.pk}/upgrade-options/', {'hotel': 'x'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_only_confirmed_bookings_have_upgrade_options(self):
+        pending = self.book(self.room, date(2030, 5, 1), date(2030, 5, 3))
+        response = self.client.get(f'/v1/bookings/{pending.pk}/upgrade-options/')
+        self.assertEqual(response.status_code, 400)
+
+    def test_upgrade_room_checks_the_booking_dates(self):
+        self.assertFalse(self.booking.upgrade_room(self.large_room))
+        self.assertTrue(self.booking.upgrade_room(self.free_large_room))
+        self.booking.refresh_from_db()
+        self.assertEqual(self.booking.room, self.free_large_room)
+        self.assertEqual(self.booking.total_price, Decimal('540.00'))
+
+    def test_upgrade_endpoint(self):
+        url = f'/v1/bookings/{self.booking.pk}/upgrade_room/'
+        response = self.client.post(url, {'new_room_id': self.large_room.pk}, content_type='application/json')
+        self.assertEqual(response.json(), {'error': 'The selected room is not available for your dates'})
+        response = self.client.post(url, {'new_room_id': self.room.pk}, content_type='application/json')
+        self.assertEqual(response.json(), {'error': 'The selected room is not an upgrade from your current room'})
+        response = self.client.post(url, {'new_room_id': self.normal_room.pk}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.booking.refresh_from_db()
+        self.assertEqual(self.booking.room, self.normal_room)
+
+
+class FlexibleSearchTests(SimpleTestCase):
+    def test_feasible_starts_matches_a_naive_check(self):
+        rng = random.Random(7)
+        for _ in range(200):
+            days = rng.randint(1, 70)
+            free = rng.getrandbits(days)
+            nights = rng.randint(1, 12)
+            expected = sum(
+                1 << day for day in range(days - nights + 1)
+                if all(free >> night & 1 for night in range(day, day + nights))
+            )
+            self.assertEqual(feasible_starts(free, nights), expected, (bin(free), nights))
+
+    def test_search_flexible_matches_a_naive_search(self):
+        rng = random.Random(11)
+        window_start = date(2030, 1, 1)
+        window_end = window_start + timedelta(days=30)
+        rooms = [(room_id, room_id // 5, Decimal(rng.randrange(50, 500))) for room_id in range(20)]
+        bookings = []
+        for room_id, _, _ in rooms:
+            for _ in range(rng.randint(0, 4)):
+                check_in = window_start + timedelta(days=rng.randint(-5, 30))
+                bookings.append((room_id, check_in, check_in + timedelta(days=rng.randint(1, 7))))
+
+        for nights, weekdays in [(1, None), (3, None), (4, {4, 5})]:
+            results = search_flexible(rooms, bookings, window_start, window_end, nights, weekdays)
+            actual = {
+                result['check_in']: (result['available_rooms'], result['lowest_price_per_night'])
+                for result in results
+            }
+            self.assertEqual(actual, naive_search(rooms, bookings, window_start, window_end, nights, weekdays))
+
+
+class FlexibleSearchEndpointTests(BookingDataMixin, TestCase):
+    def test_lists_start_dates_with_free_rooms(self):
+        # room is booked Mar 1-4, the other rooms are free
+        self.book(self.large_room, date(2030, 3, 1), date(2030, 3, 3), status=BookingStatus.CONFIRMED)
+        response = self.client.get('/v1/rooms/flexible/', {
+            'window_start': '2030-03-01', 'window_end': '2030-03-06', 'nights': 2, 'hotel': self.hotel.pk,
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(result['check_in'], result['available_rooms'], result['lowest_price_per_night'])
+             for result in response.json()['results']],
+            [('2030-03-03', 1, '200.00'), ('2030-03-04', 2, '100.00')]
+        )
+
+    def test_rejects_invalid_searches(self):
+        for params in [
+            {'window_start': '2030-03-01', 'window_end': '2030-03-06'},
+            {'window_start': '2030-03-01', 'window_end': '2030-03-06', 'nights': 'x'},
+            {'window_start': '2030-03-01', 'window_end': '2030-03-03', 'nights': 3},
+            {'window_start': '2030-03-01', 'window_end': '2030-03-06', 'nights': 2, 'weekdays': 'funday'},
+            {'window_start': '2030-03-01', 'window_end': '2030-06-30', 'nights': 91},
+        ]:
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get('/v1/rooms/flexible/', params).status_code, 400)
+
+
+class BookingHoldTests(BookingDataMixin, TestCase):
+    def test_new_pending_booking_holds_the_room(self):
+        booking = self.book(self.large_room, date(2030, 3, 1), date(2030, 3, 4))
+
+        self.assertEqual(booking.status, BookingStatus.PENDING)
+        self.assertIsNotNone(booking.expires_at)
+        self.assertTrue(Booking.objects.overlapping(date(2030, 3, 3), date(2030, 3, 5)).filter(pk=booking.pk).exists())
+
+    def test_confirm(self):
+        booking = self.book(self.large_room, date(2030, 3, 1), date(2030, 3, 4))
+
+        self.assertTrue(booking.confirm())
+        booking.refresh_from_db()
+        self.assertEqual(booking.status, BookingStatus.CONFIRMED)
+        self.assertIsNone(booking.expires_at)
+
+    def test_expired_hold_cannot_be_confirmed(self):
+        booking = self.book(self.large_room, date(2030, 3, 1), date(2030, 3, 4),
+                            expires_at=timezone.now() - timedelta(minutes=1))
+
+        self.assertFalse(booking.confirm())
+        booking.refresh_from_db()
+        self.assertEqual(booking.status, BookingStatus.PENDING)
+
+    def test_release_expired_holds(self):
+        expired = self.book(self.large_room, date(2030, 3, 1), date(2030, 3, 4),
+                            expires_at=timezone.now() - timedelta(minutes=1))
+        held = self.book(self.large_room, date(2030, 4, 1), date(2030, 4, 3))
+
+        self.assertEqual(Booking.objects.release_expired_holds(), 1)
+        self.assertEqual(Booking.objects.release_expired_holds(), 0)
+        statuses = dict(Booking.objects.values_list('pk', 'status'))
+        self.assertEqual(statuses[expired.pk], BookingStatus.CANCELLED)
+        self.assertEqual(statuses[held.pk], BookingStatus.PENDING)
+        self.assertEqual(statuses[self.booking.pk], BookingStatus.CONFIRMED)
+
+    def test_sweeping_job_releases_holds_and_reschedules_itself(self):
+        expired = self.book(self.large_room, date(2030, 3, 1), date(2030, 3, 4),
+                            expires_at=timezone.now() - timedelta(minutes=1))
+        call_command('release_expired_holds', '--schedule', stdout=StringIO())
+        call_command('release_expired_holds', '--schedule', stdout=StringIO())
+        job, = [job for job in jobs.claim_jobs('tests', ['default'], limit=10)
+                if job.task == 'bookings.release_expired_holds']
+
+        self.assertTrue(jobs.run_job(job))
+        expired.refresh_from_db()
+        self.assertEqual(expired.status, BookingStatus.CANCELLED)
+        next_job = Job.objects.get(task='bookings.release_expired_holds', status=JobStatus.PENDING)
+        self.assertGreater(next_job.run_at, timezone.now())
+
+
+class BookingPartitionTests(BookingDataMixin, TestCase):
+    def test_stays_longer_than_the_maximum_are_rejected(self):
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            self.book(self.large_room, date(2030, 3, 1), date(2030, 3, 1) + timedelta(days=91))
+
+    def test_overlapping_skips_nothing_within_the_maximum_stay(self):
+        long_stay = self.book(self.large_room, date(2030, 1, 1), date(2030, 3, 31), status=BookingStatus.CONFIRMED)
+
+        self.assertTrue(Booking.objects.overlapping(date(2030, 3, 30), date(2030, 4, 2)).filter(pk=long_stay.pk).exists())
+
+    def test_new_partition_takes_over_rows_from_the_default_partition(self):
+        if not partitions.is_supported(connection):
+            self.skipTest('Booking partitions require PostgreSQL')
+        month = partitions.add_months(date.today().replace(day=1), 30)
+        booking = self.book(self.large_room, month, month + timedelta(days=2))
+
+        self.assertEqual(partitions.ensure_partitions(connection, month, 30),
+                         [partitions.partition_name(partitions.BOOKING_TABLE, month)])
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT tableoid::regclass::text FROM main_booking WHERE id = %s", [booking.pk])
+            self.assertEqual(cursor.fetchone()[0], partitions.partition_name(partitions.BOOKING_TABLE, month))
+
+
+class ChangeFeedTests(BookingDataMixin, TestCase):
+    def get(self, **params):
+        return self.client.get('/v1/changes/', params)
+
+    def test_change_data_matches_the_api(self):
+        change = Change.objects.filter(kind=ChangeKind.ROOM_SAVED, object_id=self.room.pk).get()
+        self.assertEqual(change.data['price_per_night'], '100.00')
+
+    def test_bookings_record_their_status_changes(self):
+        booking = self.book(self.large_room, date(2030, 3, 1), date(2030, 3, 4))
+        booking.confirm()
+
+        change = Change.objects.filter(kind=ChangeKind.BOOKING_CONFIRMED, object_id=booking.pk).get()
+        self.assertEqual((change.hotel_id, change.data['status']), (self.hotel.pk, BookingStatus.CONFIRMED))
+
+    def test_pages_through_the_feed_with_the_cursor(self):
+        ids = list(Change.objects.order_by('pk').values_list('pk', flat=True))
+
+        first = self.get(since=ids[0] - 1, limit=2).json()
+        self.assertEqual([change['id'] for change in first['results']], ids[:2])
+        self.assertEqual((first['cursor'], first['has_more']), (ids[1], True))
+        rest = self.get(since=first['cursor']).json()
+        self.assertEqual([change['id'] for change in rest['results']], ids[2:])
+        self.assertEqual((rest['cursor'], rest['has_more']), (ids[-1], False))
+        latest = self.get(since='latest').json()
+        self.assertEqual((latest['cursor'], latest['results']), (ids[-1], []))
+
+    def test_filters_by_hotel(self):
+        response = self.get(since=Change.objects.order_by('pk').first().pk - 1, hotel=str(self.other_hotel.pk))
+        self.assertEqual({change['hotel'] for change in response.json()['results']}, {self.other_hotel.pk})
+
+    def test_rejects_invalid_parameters(self):
+        for params in [{'since': 'x'}, {'hotel': 'a,b'}, {'limit': '0'}]:
+            with self.subTest(params=params):
+                self.assertEqual(self.get(**params).status_code, 400)
+
+    def test_pruned_cursors_are_gone(self):
+        Change.objects.update(created_at=timezone.now() - timedelta(days=8))
+        total = Change.objects.count()
+        latest = Change.objects.latest_cursor()
+
+        self.assertEqual(Change.objects.prune(days=7), total - 1)
+        self.assertEqual(self.get(since=latest - 2).status_code, 410)
+        self.assertEqual(self.get(since=latest - 1).status_code, 200)
+        self.assertEqual(self.get(since=latest).status_code, 200)
+
+    def test_pruning_job_reschedules_itself(self):
+        call_command('prune_changes', '--schedule', stdout=StringIO())
+        job = Job.objects.get(task='changes.prune')
+        Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        claimed, = [job for job in jobs.claim_jobs('tests', ['default'], limit=10) if job.task == 'changes.prune']
+
+        self.assertTrue(jobs.run_job(claimed))
+        next_job = Job.objects.get(task='changes.prune', status=JobStatus.PENDING)
+        self.assertGreater(next_job.run_at, timezone.now() + timedelta(hours=23))
+
+
+class WarmUpTests(SimpleTestCase):
+    def test_warm_up_runs_every_step(self):
+        with self.assertNoLogs('main.warmup'):
+            timings = warmup.warm_up(requests=False)
+
+        steps = [step for step, _ in timings]
+        self.assertEqual(steps[:4], ['models', 'translations', 'urls', 'rest_framework'])
+        self.assertIn('serializers.BookingSerializer', steps)
+        self.assertFalse(any(step.startswith('requests.') for step in steps))
+
+    def test_warm_request_serves_through_the_middleware(self):
+        handler = warmup.WSGIHandler()
+        self.assertEqual(warmup.warm_request(handler, '/no-such-page/'), '404 Not Found')
+
+
+def create_package(**kwargs):
+    return TravelPackage.objects.create(**{
+        'title': 'Alps',
+        'description': 'Hiking',
+        'destination': 'Zermatt',
+        'duration_days': 5,
+        'price': 900,
+        'available_from': date(2030, 1, 1),
+        'available_to': date(2030, 12, 31),
+        **kwargs
+    })
+
+
+class SeatReservationTests(TestCase):
+    def test_reserve_takes_seats_only_when_enough_are_left(self):
+        package = create_package(capacity=3)
+        packages = TravelPackage.objects.filter(pk=package.pk)
+
+        self.assertTrue(packages.reserve(2))
+        self.assertFalse(packages.reserve(2))
+        package.refresh_from_db()
+        self.assertEqual(package.remaining, 1)
+
+    def test_book_sells_up_to_capacity(self):
+        package = create_package(capacity=2)
+
+        self.assertIsNotNone(package.book('Ann', 'ann@example.com', seats=2))
+        self.assertIsNone(package.book('Bob', 'bob@example.com'))
+        package.refresh_from_db()
+        self.assertEqual(package.remaining, 0)
+        self.assertEqual(PackageBooking.objects.filter(package=package).count(), 1)
+
+    def test_book_gives_departure_seats_back_when_the_package_is_short(self):
+        package = create_package(capacity=5)
+        departure = PackageDeparture.objects.create(package=package, departure_date=date(2030, 6, 1), capacity=5)
+        # Sold elsewhere after this instance was loaded, so it still looks like it has seats
+        TravelPackage.objects.filter(pk=package.pk).reserve(4)
+
+        self.assertIsNone(package.book('Ann', 'ann@example.com', seats=2, departure=departure))
+        departure.refresh_from_db()
+        self.assertEqual(departure.remaining, 5)
+        self.assertFalse(PackageBooking.objects.exists())
+
+    def test_book_departure_without_capacity(self):
+        package = create_package(capacity=2)
+        departure = PackageDeparture.objects.create(package=package, departure_date=date(2030, 6, 1))
+
+        self.assertIsNotNone(package.book('Ann', 'ann@example.com', departure=departure))
+        departure.refresh_from_db()
+        self.assertIsNone(departure.remaining)
+
+    def test_capacity_change_keeps_booked_seats(self):
+        package = create_package(capacity=4)
+        package.book('Ann', 'ann@example.com', seats=3)
+
+        package.capacity = 10
+        package.save()
+        package.refresh_from_db()
+        self.assertEqual(package.remaining, 7)
+
+    def test_cancel_gives_the_seats_back_once(self):
+        package = create_package(capacity=5)
+        departure = PackageDeparture.objects.create(package=package, departure_date=date(2030, 6, 1), capacity=4)
+        booking = package.book('Ann', 'ann@example.com', seats=3, departure=departure)
+
+        self.assertTrue(booking.cancel())
+        self.assertFalse(PackageBooking.objects.get(pk=booking.pk).cancel())
+        package.refresh_from_db()
+        departure.refresh_from_db()
+        self.assertEqual((package.remaining, departure.remaining), (5, 4))
+        self.assertEqual(PackageBooking.objects.get(pk=booking.pk).status, BookingStatus.CANCELLED)
+
+    def test_cancel_leaves_unlimited_counters_alone(self):
+        package = create_package()
+        booking = package.book('Ann', 'ann@example.com', seats=2)
+
+        self.assertTrue(booking.cancel())
+        package.refresh_from_db()
+        self.assertIsNone(package.remaining)
+
+
+class PackageBookingAdminTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'secret')
+        cls.package = create_package(capacity=5)
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def test_seats_cannot_be_edited(self):
+        booking = self.package.book('Ann', 'ann@example.com', seats=2)
+        self.client.post(f'/admin/main/packagebooking/{booking.pk}/change/', {
+            'name': 'Anna', 'email': 'ann@example.com', 'seats': 5, 'status': BookingStatus.CANCELLED,
+        })
+
+        booking.refresh_from_db()
+        self.assertEqual((booking.name, booking.seats, booking.status), ('Anna', 2, BookingStatus.CONFIRMED))
+        self.assertEqual(self.client.get('/admin/main/packagebooking/add/').status_code, 403)
+
+    def test_cancel_and_delete_give_the_seats_back(self):
+        cancelled = self.package.book('Ann', 'ann@example.com', seats=2)
+        deleted = self.package.book('Bob', 'bob@example.com', seats=1)
+
+        self.client.post('/admin/main/packagebooking/', {
+            'action': 'cancel_bookings', '_selected_action': [cancelled.pk],
+        })
+        self.client.post(f'/admin/main/packagebooking/{deleted.pk}/delete/', {'post': 'yes'})
+
+        self.package.refresh_from_db()
+        self.assertEqual(self.package.remaining, 5)
+        self.assertEqual(PackageBooking.objects.get().status, BookingStatus.CANCELLED)
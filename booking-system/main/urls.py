@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import UserViewSet, HotelViewSet, RoomViewSet, BookingViewSet, TravelPackageViewSet
+from .views import UserViewSet, HotelViewSet, HotelRoomViewSet, RoomViewSet, BookingViewSet, TravelPackageViewSet, ChangeViewSet
 
 router = DefaultRouter()
 router.register(r'users', UserViewSet)
@@ -8,7 +8,9 @@ router.register(r'hotels', HotelViewSet)
 router.register(r'rooms', RoomViewSet)
 router.register(r'bookings', BookingViewSet)
 router.register(r'travel-packages', TravelPackageViewSet, basename='travelpackage')
+router.register(r'changes', ChangeViewSet)
 
 urlpatterns = [
+    path('hotels/<int:hotel_pk>/rooms/', HotelRoomViewSet.as_view({'get': 'list'}), name='hotel-rooms'),
     path('', include(router.urls)),
 ]
\ No newline at end of file
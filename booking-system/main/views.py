@@ -1,30 +1,55 @@
+from django.conf import settings
 from django.shortcuts import render
 
 # Create your views here.
 from rest_framework import viewsets, status, filters
 from rest_framework.decorators import action
-from rest_framework.permissions import AllowAny
+from rest_framework.permissions import AllowAny, SAFE_METHODS
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
-from .models import User, Hotel, Room, Booking, RoomType, BookingStatus
+from .models import User, Hotel, Room, Booking, RoomType, BookingStatus, Change, UPGRADE_PATHS
 from .serializers import (
+    DynamicFieldsMixin,
     UserSerializer,
     HotelSerializer,
     HotelListSerializer,
     RoomSerializer,
     BookingSerializer,
     BookingCancelSerializer,
-    RoomUpgradeSerializer
+    RoomUpgradeSerializer,
+    UpgradeOptionSerializer,
+    FlexibleSearchResultSerializer
 )
+from .availability import MAX_WINDOW_DAYS, flexible_search, parse_weekdays
+from .changes import STREAM_PATH, parse_cursor, parse_hotels, parse_limit, read_changes
 from django.db.models import Q
+from django.shortcuts import get_object_or_404
 from datetime import date
 
 from rest_framework import viewsets
 from .models import TravelPackage
-from .serializers import TravelPackageSerializer
+from .serializers import TravelPackageSerializer, PackageBookingSerializer
 
 
-class UserViewSet(viewsets.ModelViewSet):
+class SparseFieldsetMixin:
+    """
+    Shape read querysets around the ``?fields=`` / ``?expand=`` the client asked for
+    """
+
+    def optimize_queryset(self, queryset):
+        request = getattr(self, 'request', None)
+        if request is None or request.method not in SAFE_METHODS:
+            return queryset
+        serializer = self.get_serializer()
+        if isinstance(serializer, DynamicFieldsMixin) and serializer.Meta.model is queryset.model:
+            queryset = serializer.optimize_queryset(queryset)
+        return queryset
+
+    def get_queryset(self):
+        return self.optimize_queryset(super().get_queryset())
+
+
+class UserViewSet(SparseFieldsetMixin, viewsets.ModelViewSet):
     """
     API endpoint for User CRUD operations
     """
@@ -34,7 +59,7 @@ class UserViewSet(viewsets.ModelViewSet):
     search_fields = ['name', 'email', 'phone']
 
 
-class TravelPackageViewSet(viewsets.ModelViewSet):
+class TravelPackageViewSet(SparseFieldsetMixin, viewsets.ModelViewSet):
     """
     A simple ViewSet for viewing and editing travel packages.
     """
@@ -47,7 +72,7 @@ class TravelPackageViewSet(viewsets.ModelViewSet):
         Custom action to filter travel packages by category.
         Example: /api/travel-packages/category/Adventure/
         """
-        queryset = TravelPackage.objects.filter(category=category)
+        queryset = self.optimize_queryset(TravelPackage.objects.filter(category=category))
 
         if not queryset.exists():
             return Response({"message": "No packages found for this category."}, status=status.HTTP_404_NOT_FOUND)
@@ -74,21 +99,42 @@ class TravelPackageViewSet(viewsets.ModelViewSet):
         if not name or not email:
             return Response({"error": "Name and email are required."}, status=status.HTTP_400_BAD_REQUEST)
 
-        # For simplicity, we just return a success message. You can extend this by saving bookings to a model.
+        serializer = PackageBookingSerializer(data=request.data, context={'package': travel_package})
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        booking = travel_package.book(**serializer.validated_data)
+        if booking is None:
+            return Response(
+                {"error": "Not enough seats left on this package."},
+                status=status.HTTP_409_CONFLICT
+            )
+
         return Response({
             "message": f"Booking for {travel_package.title} confirmed.",
             "name": name,
-            "email": email
+            "email": email,
+            "booking": PackageBookingSerializer(booking).data
         }, status=status.HTTP_201_CREATED)
 
 
-class HotelViewSet(viewsets.ReadOnlyModelViewSet):
+class HotelViewSet(SparseFieldsetMixin, viewsets.ReadOnlyModelViewSet):
     """
     API endpoint for listing hotels
     """
     queryset = Hotel.objects.all().order_by('name')
-    filter_backends = [filters.SearchFilter]
+    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filterset_fields = {
+        'rating': ['gte', 'lte'],
+        'active_room_count': ['gte', 'lte'],
+        'small_room_count': ['gte'],
+        'normal_room_count': ['gte'],
+        'large_room_count': ['gte'],
+        'min_price_per_night': ['gte', 'lte'],
+        'max_price_per_night': ['gte', 'lte'],
+    }
     search_fields = ['name', 'address']
+    ordering_fields = ['name', 'rating', 'active_room_count', 'min_price_per_night', 'max_price_per_night']
 
     def get_serializer_class(self):
         if self.action == 'list':
@@ -96,7 +142,7 @@ class HotelViewSet(viewsets.ReadOnlyModelViewSet):
         return HotelSerializer
 
 
-class RoomViewSet(viewsets.ReadOnlyModelViewSet):
+class RoomViewSet(SparseFieldsetMixin, viewsets.ReadOnlyModelViewSet):
     """
     API endpoint for listing rooms
     """
@@ -137,24 +183,94 @@ class RoomViewSet(viewsets.ReadOnlyModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        # Get booked rooms for the date range
-        booked_rooms = Booking.objects.filter(
-            status=BookingStatus.CONFIRMED,
-            check_in_date__lt=check_out_date,
-            check_out_date__gt=check_in_date
-        ).values_list('room_id', flat=True)
-
-        # Filter available rooms
-        queryset = Room.objects.filter(is_active=True).exclude(id__in=booked_rooms)
+        # Filter rooms without bookings in the date range
+        queryset = Room.objects.available_between(check_in_date, check_out_date)
 
         if room_type and room_type in dict(RoomType.choices):
             queryset = queryset.filter(room_type=room_type)
 
+        queryset = self.optimize_queryset(queryset)
+
         serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
 
+    @action(detail=False, methods=['get'])
+    def flexible(self, request):
+        """
+        Endpoint to find every start date with a free room for a stay of a given length
+        ?window_start=YYYY-MM-DD&window_end=YYYY-MM-DD&nights=N&weekdays=sat,sun
+        Accepts the room list filters as well, e.g. &room_type=TYPE&hotel=ID
+        """
+        window_start = request.query_params.get('window_start')
+        window_end = request.query_params.get('window_end')
+        nights = request.query_params.get('nights')
+        weekdays = request.query_params.get('weekdays')
+
+        if not window_start or not window_end or not nights:
+            return Response(
+                {"error": "window_start, window_end and nights are required"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            window_start_date = date.fromisoformat(window_start)
+            window_end_date = date.fromisoformat(window_end)
+        except ValueError:
+            return Response(
+                {"error": "Invalid date format. Use YYYY-MM-DD"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        if not nights.isdigit() or int(nights) < 1:
+            return Response(
+                {"error": "nights must be a positive number"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        nights = int(nights)
+        if nights > settings.BOOKING_MAX_NIGHTS:
+            return Response(
+                {"error": f"Bookings can't be longer than {settings.BOOKING_MAX_NIGHTS} nights"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        window_days = (window_end_date - window_start_date).days
+        if nights > window_days:
+            return Response(
+                {"error": "The window must be at least as long as the stay"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if window_days > MAX_WINDOW_DAYS:
+            return Response(
+                {"error": f"The window can't be longer than {MAX_WINDOW_DAYS} days"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
 
-class BookingViewSet(viewsets.ModelViewSet):
+        try:
+            weekdays = parse_weekdays(weekdays) if weekdays else None
+        except ValueError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        rooms = self.filter_queryset(self.queryset.all())
+        results = flexible_search(rooms, window_start_date, window_end_date, nights, weekdays)
+        return Response({
+            "window_start": window_start_date,
+            "window_end": window_end_date,
+            "nights": nights,
+            "results": FlexibleSearchResultSerializer(results, many=True).data
+        })
+
+
+class HotelRoomViewSet(RoomViewSet):
+    """
+    API endpoint for listing the rooms of a single hotel
+    """
+
+    def get_queryset(self):
+        hotel = get_object_or_404(Hotel, pk=self.kwargs['hotel_pk'])
+        return super().get_queryset().filter(hotel=hotel)
+
+
+class BookingViewSet(SparseFieldsetMixin, viewsets.ModelViewSet):
     """
     API endpoint for booking operations
     """
@@ -188,6 +304,33 @@ class BookingViewSet(viewsets.ModelViewSet):
                 )
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @action(detail=True, methods=['post'])
+    def confirm(self, request, pk=None):
+        """
+        Confirm a pending booking while its hold is still valid
+        """
+        booking = self.get_object()
+
+        if booking.status != BookingStatus.PENDING:
+            return Response(
+                {"error": "Only pending bookings can be confirmed"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        if booking.is_hold_expired:
+            return Response(
+                {"error": "The hold on this booking has expired"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        if not booking.confirm():
+            return Response(
+                {"error": "This room is no longer available for the selected dates"},
+                status=status.HTTP_409_CONFLICT
+            )
+
+        return Response({"message": "Booking confirmed successfully"})
+
     @action(detail=True, methods=['post'])
     def upgrade_room(self, request, pk=None):
         """
@@ -207,40 +350,87 @@ class BookingViewSet(viewsets.ModelViewSet):
 
             try:
                 new_room = Room.objects.get(pk=new_room_id)
-
-                # Check if new room is available for these dates
-                conflicting_bookings = Booking.objects.filter(
-                    room=new_room,
-                    status=BookingStatus.CONFIRMED,
-                    check_in_date__lt=booking.check_out_date,
-                    check_out_date__gt=booking.check_in_date
-                ).exclude(pk=booking.pk)
-
-                if conflicting_bookings.exists():
-                    return Response(
-                        {"error": "The selected room is not available for your dates"},
-                        status=status.HTTP_400_BAD_REQUEST
-                    )
-
-                # If current room is SMALL and new room is not SMALL, this is an upgrade
-                if booking.room.room_type == RoomType.SMALL and new_room.room_type != RoomType.SMALL:
-                    success = booking.upgrade_room(new_room)
-                    if success:
-                        return Response({"message": "Room upgraded successfully"})
-                # If current room is NORMAL and new room is LARGE, this is an upgrade
-                elif booking.room.room_type == RoomType.NORMAL and new_room.room_type == RoomType.LARGE:
-                    success = booking.upgrade_room(new_room)
-                    if success:
-                        return Response({"message": "Room upgraded successfully"})
-                else:
-                    return Response(
-                        {"error": "The selected room is not an upgrade from your current room"},
-                        status=status.HTTP_400_BAD_REQUEST
-                    )
             except Room.DoesNotExist:
                 return Response(
                     {"error": "Room not found"},
                     status=status.HTTP_404_NOT_FOUND
                 )
 
+            if new_room.room_type not in UPGRADE_PATHS[booking.room.room_type]:
+                return Response(
+                    {"error": "The selected room is not an upgrade from your current room"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            # Checks availability for the booking's own dates
+            if not booking.upgrade_room(new_room):
+                return Response(
+                    {"error": "The selected room is not available for your dates"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            return Response({"message": "Room upgraded successfully"})
+
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    @action(detail=True, methods=['get'], url_path='upgrade-options')
+    def upgrade_options(self, request, pk=None):
+        """
+        Rooms the booking can be upgraded to for its dates, with the price difference
+        ?hotel=ID to look in another hotel
+        """
+        booking = self.get_object()
+
+        if booking.status != BookingStatus.CONFIRMED:
+            return Response(
+                {"error": "Only confirmed bookings can be upgraded"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        hotel = request.query_params.get('hotel')
+        if hotel is not None and not hotel.isdigit():
+            return Response(
+                {"error": "Invalid hotel id"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        queryset = self.optimize_queryset(booking.upgrade_options(hotel=hotel))
+        serializer = self.get_serializer(queryset, many=True)
+        return Response(serializer.data)
+
+    def get_serializer_class(self):
+        if self.action == 'upgrade_options':
+            return UpgradeOptionSerializer
+        return super().get_serializer_class()
+
+
+class ChangeViewSet(viewsets.GenericViewSet):
+    """
+    API endpoint for catching up with the change feed
+    ?since=CURSOR&hotel=ID,ID&limit=N
+    """
+    queryset = Change.objects.all()
+
+    def list(self, request):
+        try:
+            cursor = parse_cursor(request.query_params.get('since'))
+            hotels = parse_hotels(request.query_params.get('hotel'))
+            limit = parse_limit(request.query_params.get('limit'))
+        except ValueError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        if Change.objects.is_expired_cursor(cursor):
+            return Response(
+                {"error": 'Changes after this cursor were pruned, reload and start from "latest"'},
+                status=status.HTTP_410_GONE
+            )
+
+        changes = read_changes(cursor, hotels, limit + 1)
+        has_more = len(changes) > limit
+        changes = changes[:limit]
+        return Response({
+            "cursor": changes[-1]['id'] if changes else cursor,
+            "has_more": has_more,
+            "stream": request.build_absolute_uri(STREAM_PATH),
+            "results": changes
+        })
@@ -0,0 +1,170 @@
+"""
+Warm-up for application servers.
+
+Django and DRF build a lot lazily on the first request a process serves:
+model metadata, the URL resolver, translation catalogs, DRF's configured
+classes and serializer fields. ``warm_up`` does that up front, so with
+gunicorn's ``preload_app`` it runs once in the master and every forked
+worker inherits the result. Database connections can't be shared across a
+fork, ``warm_worker`` opens them in each worker instead.
+"""
+import inspect
+import logging
+import sys
+import time
+from io import BytesIO
+
+from django.apps import apps
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+from django.db import connections
+from django.template.loader import get_template
+from django.urls import get_resolver
+from django.utils import translation
+from rest_framework import serializers as drf_serializers
+from rest_framework.settings import api_settings
+
+logger = logging.getLogger(__name__)
+
+# DRF settings holding classes, imported on first access
+API_CLASS_SETTINGS = [
+    'DEFAULT_RENDERER_CLASSES',
+    'DEFAULT_PARSER_CLASSES',
+    'DEFAULT_AUTHENTICATION_CLASSES',
+    'DEFAULT_PERMISSION_CLASSES',
+    'DEFAULT_THROTTLE_CLASSES',
+    'DEFAULT_CONTENT_NEGOTIATION_CLASS',
+    'DEFAULT_METADATA_CLASS',
+    'DEFAULT_VERSIONING_CLASS',
+    'DEFAULT_PAGINATION_CLASS',
+    'DEFAULT_FILTER_BACKENDS',
+    'DEFAULT_SCHEMA_CLASS',
+    'EXCEPTION_HANDLER',
+]
+
+
+def warm_models():
+    for model in apps.get_models():
+        model._meta.get_fields()
+        model._meta.related_objects
+
+
+def warm_translations():
+    with translation.override(settings.LANGUAGE_CODE):
+        translation.gettext('Pending')
+
+
+def warm_urls():
+    resolver = get_resolver()
+    resolver.reverse_dict
+    for prefix in settings.WARMUP_PATHS:
+        resolver.resolve(prefix)
+
+
+def warm_rest_framework():
+    for name in API_CLASS_SETTINGS:
+        getattr(api_settings, name)
+    get_template('rest_framework/api.html')
+
+
+def serializer_classes():
+    """Model serializers of the main app"""
+    from . import serializers
+
+    return [
+        cls for _, cls in inspect.getmembers(serializers, inspect.isclass)
+        if issubclass(cls, drf_serializers.ModelSerializer) and cls.__module__ == serializers.__name__
+    ]
+
+
+def warm_serializer(serializer_class):
+    """Build a serializer's fields, and its query plan for serializers with sparse fieldsets"""
+    from .serializers import DynamicFieldsMixin
+
+    serializer = serializer_class(context={})
+    serializer.fields
+    if isinstance(serializer, DynamicFieldsMixin):
+        serializer.get_query_plan()
+
+
+def _host():
+    for host in settings.ALLOWED_HOSTS:
+        if host != '*':
+            return host.lstrip('.')
+    return 'localhost'
+
+
+def warm_request(handler, path):
+    """Serve a GET for ``path`` through the full middleware stack, returning the status"""
+    environ = {
+        'REQUEST_METHOD': 'GET',
+        'PATH_INFO': path,
+        'QUERY_STRING': '',
+        'SCRIPT_NAME': '',
+        'SERVER_NAME': _host(),
+        'SERVER_PORT': '80',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'HTTP_HOST': _host(),
+        'HTTP_ACCEPT': 'application/json',
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': 'http',
+        'wsgi.input': BytesIO(),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': False,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    statuses = []
+    response = handler(environ, lambda status, headers, exc_info=None: statuses.append(status))
+    try:
+        for _ in response:
+            pass
+    finally:
+        response.close()
+    return statuses[0]
+
+
+def _timed(timings, label, func, *args):
+    started = time.perf_counter()
+    try:
+        func(*args)
+    except Exception:
+        # Warming up is best effort, the first request just pays for what failed here
+        logger.exception('Warm-up step %s failed', label)
+    timings.append((label, time.perf_counter() - started))
+
+
+def warm_up(requests=None):
+    """
+    Build everything processes otherwise build on their first requests.
+
+    With ``requests`` (``settings.WARMUP_REQUESTS`` by default) the
+    ``settings.WARMUP_PATHS`` are also served once, which runs their views
+    and loads the hot hotel, room and package rows into the database cache.
+    Connections opened for that are closed again. Returns ``(step, seconds)``
+    pairs.
+    """
+    if requests is None:
+        requests = settings.WARMUP_REQUESTS
+
+    timings = []
+    _timed(timings, 'models', warm_models)
+    _timed(timings, 'translations', warm_translations)
+    _timed(timings, 'urls', warm_urls)
+    _timed(timings, 'rest_framework', warm_rest_framework)
+    for serializer_class in serializer_classes():
+        _timed(timings, f'serializers.{serializer_class.__name__}', warm_serializer, serializer_class)
+    if requests:
+        handler = WSGIHandler()
+        for path in settings.WARMUP_PATHS:
+            _timed(timings, f'requests.{path}', warm_request, handler, path)
+        connections.close_all()
+    return timings
+
+
+def warm_worker():
+    """Open this process's database connections, returning ``(step, seconds)`` pairs"""
+    timings = []
+    for connection in connections.all():
+        _timed(timings, f'database.{connection.alias}', connection.ensure_connection)
+    return timings
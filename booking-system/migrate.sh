@@ -4,10 +4,22 @@
 echo "Applying database migrations..."
 python manage.py migrate
 
+# Make sure booking partitions exist for the coming months
+echo "Creating booking partitions..."
+python manage.py create_booking_partitions --schedule
+
+# Queue the recurring job cancelling expired booking holds
+echo "Scheduling the hold sweeper..."
+python manage.py release_expired_holds --schedule
+
+# Prune the change feed, then keep doing so daily
+echo "Pruning the change feed..."
+python manage.py prune_changes --schedule
+
 # Collect static files (if applicable)
 echo "Collecting static files..."
 python manage.py collectstatic --noinput
 
-# Start the Gunicorn server
+# Start the Gunicorn server, workers are forked from a warmed up master (see gunicorn.conf.py)
 echo "Starting Gunicorn server..."
-gunicorn settings.wsgi:application --bind 0.0.0.0:8000
\ No newline at end of file
+gunicorn settings.wsgi:application --config gunicorn.conf.py
\ No newline at end of file
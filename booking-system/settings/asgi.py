@@ -11,6 +11,17 @@ import os
 
 from django.core.asgi import get_asgi_application
 
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'settings.settings')
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'settings.build.production')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported once Django is set up
+from main.changes import STREAM_PATH, change_stream  # noqa: E402
+
+
+async def application(scope, receive, send):
+    """Serve the change feed stream directly, everything else through Django"""
+    if scope['type'] == 'http' and scope['path'] == STREAM_PATH:
+        await change_stream(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
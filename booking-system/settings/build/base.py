@@ -132,9 +132,34 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 
 
 
-# Media settings for hotel images
+# Media settings for hotel images, stored next to manage.py (/app/media in the
+# containers, where the media volume is mounted and nginx serves it from)
 MEDIA_URL = '/media/'
-MEDIA_ROOT = BASE_DIR / 'media'
+MEDIA_ROOT = BASE_DIR.parent / 'media'
+
+# How long a new pending booking holds its room before it expires
+BOOKING_HOLD_MINUTES = 15
+
+# How often the bookings.release_expired_holds job cancels expired holds
+BOOKING_HOLD_SWEEP_SECONDS = 60
+
+# Longest stay a booking may have, availability queries rely on it to prune
+# old booking partitions
+BOOKING_MAX_NIGHTS = 90
+
+# How often the change feed streams look for new changes, and how long they
+# stay quiet before sending a keep-alive
+CHANGE_FEED_POLL_SECONDS = 1
+CHANGE_FEED_HEARTBEAT_SECONDS = 15
+
+# Warm-up run before gunicorn forks its workers, see main/warmup.py.
+# WARMUP_REQUESTS also serves WARMUP_PATHS once to prime the database cache
+WARMUP_PATHS = ['/v1/hotels/', '/v1/rooms/', '/v1/travel-packages/']
+WARMUP_REQUESTS = os.getenv('WARMUP_REQUESTS', '0') == '1'
+
+# Outgoing mail, used by the booking notification jobs in main/tasks.py
+EMAIL_BACKEND = os.getenv('EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend')
+DEFAULT_FROM_EMAIL = os.getenv('DEFAULT_FROM_EMAIL', 'bookings@localhost')
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field